@@ -0,0 +1,120 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# Per-call cost of the emoji scanner against the old scan of the whole emoji table, with the same results checked
+# Usage: python bench/emoji.py
+# The dependencies in requirements.txt should be installed, config.ini is not needed
+
+import sys
+from copy import deepcopy
+from os.path import abspath, dirname
+from time import perf_counter
+from types import ModuleType
+from typing import Callable, Dict
+
+# Repository root
+ROOT = dirname(dirname(abspath(__file__)))
+
+# Calls of every round
+rounds = 200
+
+# Texts of names, a normal group chat and of spam
+texts = {
+    "short name": "Alice 🌸",
+    "chat 200ch": ("Good morning everyone 🙂 the meeting moved to 3pm, see the pinned message for the link. "
+                   "Thanks for the help yesterday 👍👍 the bot works fine now, I will report back later ❤️"),
+    "chinese 300ch": "今天的更新看了吗？新版本修复了很多问题，群里的小伙伴可以试一下，有问题在这里反馈就好。" * 6,
+    "spam 30 emoji": "💰💰💰 日赚500 🔥🔥 点击链接 👉👉 t.me/joinchat/xxxx 🎁🎁🎁 名额有限 ‼️‼️ " * 3,
+    "spam 200 emoji": "🇺🇸💰🔥👉🎁‼️👨‍👩‍👧‍👦1️⃣👍🏻❤️" * 20
+}
+
+
+def get_glovar() -> ModuleType:
+    # Get the global variables used by the emoji scanner, without reading config.ini
+    from pyrogram import emoji
+
+    glovar = ModuleType("plugins.glovar")
+    glovar.__dict__.update(
+        emoji_protect="\U0001F642",
+        emoji_set={v for k, v in vars(emoji).items() if not k.startswith("_")},
+        emoji_starts=None,
+        emoji_trie={}
+    )
+
+    return glovar
+
+
+def get_emoji_old(glovar: ModuleType, text: str) -> Dict[str, int]:
+    # Get the emoji counts of the text, the way before the trie
+    result = {}
+
+    if not text:
+        return {}
+
+    emoji_set = {emoji for emoji in glovar.emoji_set if emoji in text and emoji not in glovar.emoji_protect}
+    emoji_old_set = deepcopy(emoji_set)
+
+    for emoji in emoji_old_set:
+        if any(emoji in emoji_old and emoji != emoji_old for emoji_old in emoji_old_set):
+            emoji_set.discard(emoji)
+
+    for emoji in emoji_set:
+        result[emoji] = text.count(emoji)
+
+    return result
+
+
+def measure(func: Callable[[str], Dict[str, int]], text: str) -> float:
+    # Measure the function, return microseconds per call
+    func(text)
+    begin = perf_counter()
+
+    for _ in range(rounds):
+        func(text)
+
+    return (perf_counter() - begin) / rounds * 1e6
+
+
+def main() -> None:
+    # Print the table
+    sys.path.insert(0, ROOT)
+    glovar = get_glovar()
+    sys.modules["plugins.glovar"] = glovar
+
+    import plugins
+    plugins.glovar = glovar
+
+    from plugins.functions.emoji import get_emoji, init_emoji
+
+    begin = perf_counter()
+    init_emoji()
+    print(f"{len(glovar.emoji_set)} emojis, trie built in {(perf_counter() - begin) * 1e3:.1f} ms\n")
+    print(f"{'text':<16}  {'old us/call':>11}  {'new us/call':>11}  {'emojis':>6}  {'same':>4}")
+
+    for name, text in texts.items():
+        old = measure(lambda t: get_emoji_old(glovar, t), text)
+        new = measure(get_emoji, text)
+        counts = get_emoji(text)
+        same = counts == get_emoji_old(glovar, text)
+        print(f"{name:<16}  {old:11.1f}  {new:11.1f}  {sum(counts.values()):>6}  {'yes' if same else 'no':>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Per-message cost of the custom keyword check against the keyword count, for this tree and an older revision
+# Usage: python bench/keywords.py [revision] [--raw], e.g. the revision 8935e13 or any older one
+# The dependencies in requirements.txt should be installed, config.ini is not needed
+# --raw turns the text normalization off, so that only the keyword loop is measured
+
+import json
+import logging
+import random
+import sys
+import tarfile
+from io import BytesIO
+from os.path import abspath, dirname
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+from threading import Lock, RLock
+from time import perf_counter
+from types import ModuleType
+from typing import Any
+
+# Repository root
+ROOT = dirname(dirname(abspath(__file__)))
+
+# Keyword counts of the groups
+counts = [1, 10, 50, 100, 200]
+
+# Checked messages of every round
+rounds = 200
+
+# Texts of a normal group chat and of spam
+texts = [
+    "Does anyone know how to set up the bot for a new group? I tried the manual but the welcome message is empty.",
+    "今天的更新看了吗？新版本修复了很多问题，群里的小伙伴可以试一下，有问题在这里反馈就好。",
+    "Good morning everyone 🙂 the meeting moved to 3pm, see the pinned message for the link.",
+    "加微信 領取免費福利，日赚500，点击链接 t.me/joinchat/xxxx 马上进群，名额有限！！！",
+    "Earn $500 daily from home, no experience needed, DM me now for the crypto signals group",
+    "哈哈哈 这个表情包太好笑了，谁有原图发我一下"
+]
+
+# Names of the senders
+names = ["Alice Smith", "王小明", "Crypto Signals 💰", "免费福利 加V", "Bob"]
+
+# Words of the generated keywords
+vocabulary = ("加微信 免费 福利 日赚 点击链接 进群 名额有限 代理 兼职 刷单 博彩 彩票 贷款 色情 裸聊 返利 "
+              "crypto signals earn daily casino loan bonus airdrop giveaway investment forex porn dating").split()
+
+
+def get_glovar() -> ModuleType:
+    # Get the global variables used by the keyword check, without reading config.ini
+    glovar = ModuleType("plugins.glovar")
+    glovar.__dict__.update(
+        admin_ids={-1: set()}, aio=False, asyncio=False, bad_ids={"channels": set(), "users": set()}, bot_ids=set(),
+        compiled={}, configs={-1: {"keyword": True, "equal": False, "white": False}}, database=None,
+        declared_message_ids={-1: set()}, default_user_status={}, emoji_ad_single=15, emoji_ad_total=30,
+        emoji_many=15, emoji_protect="\U0001F642", emoji_set=set(), emoji_starts=None, emoji_trie={},
+        emoji_wb_single=10, emoji_wb_total=15, exchange_channel_id=-2, group_locks=[RLock() for _ in range(64)],
+        guard=False, hide_channel_id=-3, ignore_ids={"user": set()}, keyword_indexes={}, keyworded_ids={-1: {}},
+        keywords={-1: {"kws": {}}}, lang="cmn-Hans", lang_dict={}, matcher={}, member_ids={-1: set()},
+        normalize="--raw" not in sys.argv, nospam_id=0, regex_versions={}, rms={-1: {}}, should_hide=False,
+        spc_dict={}, spe_dict={}, special_ascii=False, special_table={}, special_version=0, sqlite=False,
+        test_group_id=-4, time_bio=300, timeout_words=set(), trust_ids={-1: set()}, user_bios={}, user_ids={},
+        watch_ids={"ban": {}, "delete": {}}, welcomed_ids={-1: set()}, white_ids=set()
+    )
+    glovar.locks = {name: Lock() for name in ["admin", "channel", "config", "file", "journal", "message",
+                                              "receive", "regex", "save", "store"]}
+
+    return glovar
+
+
+def get_keywords(count: int) -> dict:
+    # Get the custom keywords of a group
+    result = {}
+    modes_all = [{"include"}, {"include"}, {"include", "case"}, {"exact"}, {"regex"}, {"include", "name"}]
+
+    for i in range(count):
+        modes = modes_all[i % len(modes_all)]
+        words = set(random.sample(vocabulary, 4))
+
+        if "regex" in modes:
+            words = {f"{w}.{{0,4}}\\d+" for w in words}
+
+        result[f"key{i}"] = {
+            "time": 0,
+            "modes": modes,
+            "actions": {"delete"},
+            "target": "member",
+            "words": words,
+            "reply": "",
+            "count": 0,
+            "destruct": 0,
+            "raw": ""
+        }
+
+    return result
+
+
+def get_message(text: str, name: str) -> Any:
+    # Get a group message, built without a client
+    from pyrogram.types import Chat, Message, User
+
+    first_name, _, last_name = name.partition(" ")
+    user = get_object(User, id=12345678, is_self=False, is_bot=False, is_deleted=False, first_name=first_name,
+                      last_name=last_name or None, username=None)
+    chat = get_object(Chat, id=-1, type="supergroup")
+
+    return get_object(
+        Message,
+        chat=chat, from_user=user, message_id=1, date=0, text=text, caption=None, entities=None,
+        caption_entities=None, forward_from=None, forward_from_chat=None, forward_sender_name=None,
+        forward_date=None, reply_to_message=None, new_chat_members=None, left_chat_member=None, service=False,
+        edit_date=None, via_bot=None, reply_markup=None, web_page=None, media=None, document=None, audio=None,
+        photo=None, sticker=None, animation=None, video=None, voice=None, video_note=None, contact=None,
+        location=None, venue=None, poll=None, dice=None, game=None, game_high_score=None, mentioned=False,
+        sender_chat=None
+    )
+
+
+def get_object(cls: type, **kwargs) -> Any:
+    # Get a pyrogram object with the attributes only
+    result = cls.__new__(cls)
+    result.__dict__.update(kwargs)
+
+    return result
+
+
+def measure(tree: str) -> dict:
+    # Measure the tree, return microseconds per message for every keyword count
+    result = {}
+
+    sys.path.insert(0, tree)
+    glovar = get_glovar()
+    sys.modules["plugins.glovar"] = glovar
+
+    import plugins
+    plugins.glovar = glovar
+
+    from plugins.functions import filters
+
+    # The context of the update is cleared after every message, revisions before the context have none of it
+    try:
+        from plugins.functions import context
+    except ImportError:
+        context = None
+
+    logging.disable(logging.CRITICAL)
+    random.seed(79)
+    messages = [get_message(t, n) for t in texts for n in names]
+
+    for count in counts:
+        glovar.keywords[-1]["kws"] = get_keywords(count)
+        glovar.keyword_indexes.clear()
+
+        # Warm up
+        for message in messages:
+            context and context.init_context(message)
+            filters.is_keyword_message(message)
+            context and context.clear_context()
+
+        begin = perf_counter()
+
+        for i in range(rounds):
+            message = messages[i % len(messages)]
+            context and context.init_context(message)
+            filters.is_keyword_message(message)
+            context and context.clear_context()
+
+        result[count] = (perf_counter() - begin) / rounds * 1e6
+
+    return result
+
+
+def measure_revision(revision: str) -> dict:
+    # Measure a revision of the repository
+    with TemporaryDirectory() as tree:
+        archive = run(["git", "archive", revision, "plugins"], cwd=ROOT, stdout=PIPE, check=True).stdout
+        tarfile.open(fileobj=BytesIO(archive)).extractall(tree)
+
+        return measure_tree(tree)
+
+
+def measure_tree(tree: str) -> dict:
+    # Measure a tree in another process, so that the modules of different trees are not mixed
+    args = [sys.executable, abspath(__file__), "--tree", tree] + [a for a in sys.argv if a == "--raw"]
+    output = run(args, cwd=tree, stdout=PIPE, check=True).stdout
+
+    return {int(k): v for k, v in json.loads(output).items()}
+
+
+def main() -> None:
+    # Print the table
+    if "--tree" in sys.argv:
+        print(json.dumps(measure(sys.argv[sys.argv.index("--tree") + 1])))
+        return
+
+    revisions = [a for a in sys.argv[1:] if not a.startswith("--")]
+    old = revisions and measure_revision(revisions[0])
+    new = measure_tree(ROOT)
+
+    print(f"{'keywords':>8}  {'old us/msg':>10}  {'new us/msg':>10}")
+
+    for count in counts:
+        before = f"{old[count]:10.1f}" if old else f"{'-':>10}"
+        print(f"{count:>8}  {before}  {new[count]:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
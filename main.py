@@ -20,16 +20,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from asyncio import get_event_loop
 from random import randint
 
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.schedulers.background import BackgroundScheduler
 from pyrogram import Client, idle
 
 from plugins import glovar
 from plugins.functions.etc import delay
-from plugins.functions.timers import (backup_files, interval_min_01, interval_min_10, log_rotation, resend_link,
-                                      reset_count, reset_data, send_count, share_regex_timeout, update_admins,
-                                      update_members, update_pins, update_status)
+from plugins.functions.executor import wait_pools
+from plugins.functions.file import save_all
+from plugins.functions.timers import (backup_files, flush_count, interval_min_01, interval_min_10, log_rotation,
+                                      resend_link, reset_count, reset_data, send_count, share_regex_timeout,
+                                      update_admins, update_members, update_pins, update_status)
 from plugins.start import init, renew
 
 # Enable logging
@@ -41,6 +45,9 @@ init()
 # Renew session
 renew()
 
+# Event loop of the client
+glovar.loop = get_event_loop()
+
 # Config session
 app = Client(
     session_name="bot",
@@ -54,8 +61,13 @@ app.start()
 # Send online status
 delay(3, update_status, [app, "online"])
 
-# Timer
-scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
+# Timer, the jobs run in the executor of the event loop in the asyncio mode
+if glovar.asyncio:
+    scheduler = AsyncIOScheduler(event_loop=glovar.loop, job_defaults={"misfire_grace_time": 60})
+else:
+    scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
+
+scheduler.add_job(flush_count, "interval", minutes=1)
 scheduler.add_job(interval_min_01, "interval", [app], minutes=1)
 scheduler.add_job(interval_min_10, "interval", minutes=10)
 scheduler.add_job(update_status, "cron", [app, "awake"], minute=randint(30, 34), second=randint(0, 59))
@@ -74,5 +86,14 @@ scheduler.start()
 # Hold
 idle()
 
+# Wait for the tasks that should not be dropped
+wait_pools(60)
+
+# Flush the counters
+flush_count()
+
+# Save the dirty files
+save_all()
+
 # Stop
 app.stop()
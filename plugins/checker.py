@@ -185,6 +185,24 @@ def check_mode(values: dict, broken: bool) -> str:
     return result
 
 
+def check_pool(values: dict, broken: bool) -> str:
+    # Check all values in pool section
+    result = ""
+
+    for key in values:
+        if key == "pool_overflow" and values[key] not in {"block", "caller", "reject"}:
+            result += f"[ERROR] [pool] {key} - should be block, caller or reject\n"
+        elif key != "pool_overflow" and values[key] <= 0:
+            result += f"[ERROR] [pool] {key} - should be a positive integer\n"
+
+        if not broken or not result:
+            continue
+
+        raise_error(result)
+
+    return result
+
+
 def check_time(values: dict, broken: bool) -> str:
     # Check all values in time section
     result = ""
@@ -0,0 +1,223 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+from itertools import count
+from random import uniform
+from threading import Lock, local
+from time import time
+from typing import Any, Callable, Dict, NamedTuple
+
+from .. import glovar
+from .etc import delay
+from .executor import start_thread
+from .limiter import prepay_token, priorities, refund_tokens, reserves, set_priority
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Number of the action workers, the actions of one group may run on different workers and finish out of order,
+# the group lock only keeps them from running at the same time
+workers = 4
+
+# Lock of the statistics
+stats_lock = Lock()
+
+# Action of the current worker, and whether it has been deferred
+current = local()
+
+# Sequence numbers, which keep the actions of one priority in FIFO order
+sequence = count()
+
+
+class Action(NamedTuple):
+    # Telegram action decided by a handler, executed by an action worker as a whole,
+    # the results of its finished steps are kept in the state when it is deferred
+    kind: str
+    func: Callable
+    args: tuple
+    kwargs: dict
+    time: float
+    state: dict
+
+
+def action_worker() -> bool:
+    # Execute the queued actions, the ones of a higher priority first,
+    # a FloodWait or a missing token defers the whole action instead of blocking the worker
+    while True:
+        _, _, action = glovar.actions.get()
+        start = time()
+
+        try:
+            current.action = action
+            current.deferred = False
+            set_priority(action.kind)
+            action.func(*action.args, **action.kwargs)
+        except Exception as e:
+            logger.warning(f"Action {action.kind} error: {e}", exc_info=True)
+        finally:
+            current.action = None
+            refund_tokens()
+            count_action(action.kind, start - action.time, time() - start)
+            glovar.actions.task_done()
+
+
+def add_action(kind: str, func: Callable, args: tuple = (), kwargs: dict = None) -> bool:
+    # Queue an action
+    result = False
+
+    try:
+        result = put_action(Action(kind, func, args, kwargs or {}, time(), {}))
+    except Exception as e:
+        logger.warning(f"Add action error: {e}", exc_info=True)
+
+    return result
+
+
+def count_action(kind: str, wait: float, run: float) -> bool:
+    # Count the waiting time and the running time of the action
+    result = False
+
+    try:
+        with stats_lock:
+            stats = glovar.action_stats.setdefault(kind, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += wait
+            stats[2] += run
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Count action error: {e}", exc_info=True)
+
+    return result
+
+
+def get_action_stats() -> Dict[str, float]:
+    # Get the queue depth, the count of done actions and their average waiting and running milliseconds
+    result = {}
+
+    try:
+        with stats_lock:
+            done = sum(s[0] for s in glovar.action_stats.values())
+            wait = sum(s[1] for s in glovar.action_stats.values())
+            run = sum(s[2] for s in glovar.action_stats.values())
+
+        result = {
+            "depth": glovar.actions.qsize(),
+            "done": done,
+            "wait": done and round(wait / done * 1000, 1),
+            "run": done and round(run / done * 1000, 1)
+        }
+    except Exception as e:
+        logger.warning(f"Get action stats error: {e}", exc_info=True)
+
+    return result
+
+
+def init_actions() -> bool:
+    # Start the action workers
+    result = False
+
+    try:
+        for _ in range(workers):
+            start_thread(action_worker, ())
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init actions error: {e}", exc_info=True)
+
+    return result
+
+
+def defer_action(secs: float) -> bool:
+    # Queue the current action again after some seconds, return False if the current thread is not an action worker
+    result = False
+
+    try:
+        action = getattr(current, "action", None)
+
+        if action is None:
+            return False
+
+        if current.deferred:
+            return True
+
+        current.deferred = delay(secs + uniform(0.5, 1.0), put_action, [action])
+        result = current.deferred
+    except Exception as e:
+        logger.warning(f"Defer action error: {e}", exc_info=True)
+
+    return result
+
+
+def is_deferred() -> bool:
+    # Check if the current action has been deferred, its remaining calls should be skipped
+    return bool(getattr(current, "action", None) and current.deferred)
+
+
+def put_action(action: Action) -> bool:
+    # Put the action into the queue, keyed on the reserve of its priority
+    result = False
+
+    try:
+        reserve = reserves[priorities.get(action.kind, "normal")]
+        glovar.actions.put((reserve, next(sequence), action))
+        result = True
+    except Exception as e:
+        logger.warning(f"Put action error: {e}", exc_info=True)
+
+    return result
+
+
+def run_step(step: str, func: Callable, *args, **kwargs) -> Any:
+    # Run a step of the current action once, a deferred action reuses the results of its finished steps
+    action = getattr(current, "action", None)
+
+    if action is None:
+        return func(*args, **kwargs)
+
+    if step in action.state:
+        return action.state[step]
+
+    result = func(*args, **kwargs)
+
+    if result and not current.deferred:
+        action.state[step] = result
+
+    return result
+
+
+def take_token(cid: int) -> bool:
+    # Take a token of the chat before a group lock is held, return False if the current action is deferred instead
+    result = True
+
+    try:
+        if getattr(current, "action", None) is None:
+            return True
+
+        wait = prepay_token(cid)
+
+        if not wait:
+            return True
+
+        result = not defer_action(wait)
+    except Exception as e:
+        logger.warning(f"Take token error: {e}", exc_info=True)
+
+    return result
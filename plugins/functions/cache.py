@@ -0,0 +1,93 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    # Bounded LRU cache with an optional TTL, shared by threads
+    __slots__ = ("maxsize", "ttl", "data", "lock", "hits", "misses")
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.data: OrderedDict = OrderedDict()
+        self.lock: Lock = Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        # Get the value, refresh its position
+        with self.lock:
+            item = self.data.get(key)
+
+            if item is not None and self.ttl and item[1] < monotonic():
+                del self.data[key]
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return default
+
+            self.data.move_to_end(key)
+            self.hits += 1
+
+            return item[0]
+
+    def set(self, key: Hashable, value: Any) -> Any:
+        # Set the value, drop the least recently used ones
+        with self.lock:
+            self.data[key] = (value, self.ttl and monotonic() + self.ttl)
+            self.data.move_to_end(key)
+
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        # Remove the value
+        with self.lock:
+            item = self.data.pop(key, None)
+
+        return default if item is None else item[0]
+
+    def clear(self) -> bool:
+        # Remove all values
+        with self.lock:
+            self.data.clear()
+
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        # Get the counters
+        return {
+            "size": len(self.data),
+            "hits": self.hits,
+            "misses": self.misses
+        }
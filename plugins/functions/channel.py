@@ -24,6 +24,7 @@ from pyrogram import Client
 from pyrogram.types import Chat, Message, User
 
 from .. import glovar
+from .actions import run_step
 from .decorators import retry, threaded
 from .etc import code, code_block, general_link, get_forward_name, get_full_name, lang, thread
 from .file import crypt_file, data_to_file, delete_file, get_new_path
@@ -151,8 +152,10 @@ def forward_evidence(client: Client, message: Message, user: User, level: str, r
             result = send_message(client, glovar.tip_channel_id, text)
             return result
 
-        # Forward the evidence
-        result = forward_messages(
+        # Forward the evidence, a deferred action does not forward it again
+        result = run_step(
+            "forward",
+            forward_messages,
             client=client,
             cid=glovar.tip_channel_id,
             fid=message.chat.id,
@@ -203,7 +206,7 @@ def get_debug_text(client: Client, context: Union[int, Chat, List[int]]) -> str:
     return result
 
 
-@threaded()
+@threaded(pool="exchange")
 def send_debug(client: Client, gids: List[int], action: str,
                uid: int = 0, aid: int = 0,
                em: Message = 0,
@@ -258,7 +261,7 @@ def send_debug(client: Client, gids: List[int], action: str,
     return result
 
 
-@threaded()
+@threaded(pool="exchange")
 def share_data(client: Client, receivers: List[str], action: str, action_type: str,
                data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
     # Use this function to share data in the channel
@@ -314,7 +317,7 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
 
         # Delete the tmp file
         for f in {file, file_path}:
-            f.startswith(f"{glovar.TMP_PATH}/") and thread(delete_file, (f,))
+            f.startswith(f"{glovar.TMP_PATH}/") and thread(delete_file, (f,), pool="persistence")
 
         result = bool(result)
     except Exception as e:
@@ -323,7 +326,7 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
     return result
 
 
-@threaded()
+@threaded(pool="exchange")
 def share_data_failed(client: Client, receivers: List[str], action: str, action_type: str,
                       data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
     # Sharing data failed, use the exchange channel instead
@@ -357,7 +360,9 @@ def share_regex_count(client: Client, word_type: str) -> bool:
         if not eval(f"glovar.{word_type}_words"):
             return False
 
-        file = data_to_file(eval(f"glovar.{word_type}_words"))
+        counts = glovar.regex_counts.get(word_type, {})
+        words = {w: c + counts.get(w, 0) for w, c in eval(f"glovar.{word_type}_words").items()}
+        file = data_to_file(words)
         result = share_data(
             client=client,
             receivers=["REGEX"],
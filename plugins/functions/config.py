@@ -31,6 +31,7 @@ from .command import command_error
 from .decorators import threaded
 from .etc import code, code_block, general_link, get_int, get_now, get_text_user, lang, thread
 from .file import delete_file, file_json, file_txt, save
+from .keywords import reset_keyword_index
 from .markup import get_text_and_markup_tip
 from .telegram import get_group_info, send_document, send_message, send_report_message
 
@@ -249,6 +250,7 @@ def kws_add(client: Client, message: Message, gid: int, key: str, text: str, the
             glovar.keywords[gid]["kws"][key]["raw"] = text
         
         # Save the data
+        reset_keyword_index(gid)
         save("keywords")
 
         # Generate the text and the markup
@@ -314,13 +316,14 @@ def kws_clear(client: Client, message: Message, gid: int) -> bool:
             return False
 
         glovar.keywords[gid]["kws"] = {}
+        reset_keyword_index(gid)
         save("keywords")
 
         # Send the report message
         send_document(client, cid, file, None, caption, mid)
 
         # Delete the file
-        thread(delete_file, (file,))
+        thread(delete_file, (file,), pool="persistence")
 
         result = True
     except Exception as e:
@@ -420,6 +423,7 @@ def kws_remove(client: Client, message: Message, gid: int, key: str) -> bool:
 
         # Pop the data
         glovar.keywords[gid]["kws"].pop(key, {})
+        reset_keyword_index(gid)
         save("keywords")
 
         # Generate the text
@@ -555,7 +559,7 @@ def kws_show_file(client: Client, message: Message, gid: int,
         send_document(client, cid, file, None, caption, mid)
 
         # Delete the file
-        thread(delete_file, (file,))
+        thread(delete_file, (file,), pool="persistence")
 
         result = True
     except Exception as e:
@@ -0,0 +1,156 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from threading import local
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from pyrogram.types import Message
+
+from .etc import get_filename, get_forward_name, get_full_name, get_text, init_convert
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Context of the update which is being processed by the current thread
+current = local()
+
+# Whitespace patterns
+spaces_many = re.compile(r"\s{2,}")
+spaces_all = re.compile(r"\s")
+
+
+class MessageContext:
+    # Evaluation data shared by all filters during one update
+    __slots__ = ("message", "texts", "spaces", "verdicts")
+
+    def __init__(self, message: Message):
+        self.message: Message = message
+        self.texts: Dict[Tuple[str, bool, bool, bool], str] = {}
+        self.spaces: Dict[Tuple[str, bool], str] = {}
+        self.verdicts: Dict[tuple, Any] = {}
+
+
+class LazyFields(dict):
+    # Fields which are computed on the first use, by their getters called with the fields and the arguments
+    __slots__ = ("getters", "args")
+
+    def __init__(self, getters: Dict[Any, Callable[..., Any]], *args: Any):
+        super().__init__()
+        self.getters = getters
+        self.args = args
+
+    def __missing__(self, key: Any) -> Any:
+        value = self[key] = self.getters[key](self, *self.args)
+        return value
+
+
+def clear_context() -> bool:
+    # Clear the context of the current thread
+    result = False
+
+    try:
+        current.context = None
+        result = True
+    except Exception as e:
+        logger.warning(f"Clear context error: {e}", exc_info=True)
+
+    return result
+
+
+def get_context() -> Optional[MessageContext]:
+    # Get the context of the current thread
+    result = None
+
+    try:
+        result = getattr(current, "context", None)
+    except Exception as e:
+        logger.warning(f"Get context error: {e}", exc_info=True)
+
+    return result
+
+
+def get_context_spaces(text: str, again: bool = False) -> str:
+    # Get the text with merged whitespaces, or without whitespaces when trying again, cached by the context
+    result = ""
+
+    try:
+        context = get_context()
+        key = (text, again)
+
+        if context is not None and key in context.spaces:
+            return context.spaces[key]
+
+        if not again:
+            result = spaces_many.sub(" ", text)
+        elif " " in text:
+            result = spaces_all.sub("", text)
+
+        if context is not None:
+            context.spaces[key] = result
+    except Exception as e:
+        logger.warning(f"Get context spaces error: {e}", exc_info=True)
+
+    return result
+
+
+def get_context_text(message: Message, the_type: str,
+                     normal: bool = False, printable: bool = False, pure: bool = False) -> str:
+    # Get the text, sender's name, forward name or filename of the message, cached by the context
+    result = ""
+
+    try:
+        context = get_context()
+        key = (the_type, normal, printable, pure)
+
+        if context is not None and context.message is message and key in context.texts:
+            return context.texts[key]
+
+        if the_type == "text":
+            result = get_text(message, normal, printable, pure)
+        elif the_type == "name":
+            result = get_full_name(message.from_user, normal, printable, pure)
+        elif the_type == "forward":
+            result = get_forward_name(message, normal, printable, pure)
+        elif the_type == "filename":
+            result = get_filename(message, normal, printable, pure)
+
+        if context is not None and context.message is message:
+            context.texts[key] = result
+    except Exception as e:
+        logger.warning(f"Get context text error: {e}", exc_info=True)
+
+    return result
+
+
+def init_context(message: Message) -> Optional[MessageContext]:
+    # Init the context of the current thread
+    result = None
+
+    try:
+        result = MessageContext(message)
+        current.context = result
+
+        # Convert the texts of the message in one call
+        init_convert([get_text(message), get_full_name(message.from_user),
+                      get_forward_name(message), get_filename(message)])
+    except Exception as e:
+        logger.warning(f"Init context error: {e}", exc_info=True)
+
+    return result
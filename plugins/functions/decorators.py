@@ -20,22 +20,60 @@ import logging
 from functools import wraps
 
 from pyrogram.errors import FloodWait
+from pyrogram.types import Message
 
+from .actions import add_action, defer_action, is_deferred
+from .context import get_context
 from .etc import thread, wait_flood
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
 
+def cached(func):
+    # Cache the result in the message context
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        context = get_context()
+
+        if context is None:
+            return func(*args, **kwargs)
+
+        key = (func.__name__,
+               tuple(id(a) if isinstance(a, Message) else a for a in args),
+               tuple(sorted((k, id(v) if isinstance(v, Message) else v) for k, v in kwargs.items())))
+
+        if key in context.verdicts:
+            return context.verdicts[key]
+
+        result = func(*args, **kwargs)
+        context.verdicts[key] = result
+        return result
+    return wrapper
+
+
+def queued(kind: str):
+    # Run with the action workers
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return add_action(kind, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
 def retry(func):
-    # FloodWait retry
+    # FloodWait retry, an action worker defers the whole action instead of waiting, and skips its remaining calls
     @wraps(func)
     def wrapper(*args, **kwargs):
         result = None
-        while True:
+        while not is_deferred():
             try:
                 result = func(*args, **kwargs)
             except FloodWait as e:
+                if defer_action(e.x):
+                    break
+
                 wait_flood(e)
             except Exception as e:
                 logger.warning(f"Retry error: {e}", exc_info=True)
@@ -46,11 +84,11 @@ def retry(func):
     return wrapper
 
 
-def threaded(daemon: bool = True):
-    # Run with thread
+def threaded(daemon: bool = True, pool: str = "io"):
+    # Run with the thread pool
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            return thread(func, args, kwargs, daemon)
+            return thread(func, args, kwargs, daemon, pool)
         return wrapper
     return decorator
@@ -0,0 +1,150 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from typing import Dict, NamedTuple
+
+from .. import glovar
+from .cache import Cache
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class EmojiProfile(NamedTuple):
+    # Emoji statistics of a text
+    counts: Dict[str, int]
+    total: int
+    single: int
+    length: int
+
+
+# Profiles of the recently checked texts
+profiles = Cache(maxsize=1024)
+
+
+def get_emoji(text: str) -> Dict[str, int]:
+    # Get the emoji counts of the text, the longest emoji is taken at every position
+    result = {}
+
+    try:
+        if not text:
+            return {}
+
+        if glovar.emoji_starts is None:
+            init_emoji()
+
+        trie = glovar.emoji_trie
+        search = glovar.emoji_starts.search
+        length = len(text)
+        match = search(text)
+
+        while match:
+            begin = match.start()
+            end = 0
+            node = trie
+            i = begin
+
+            while i < length:
+                node = node.get(text[i])
+
+                if node is None:
+                    break
+
+                i += 1
+
+                if "" in node:
+                    end = i
+
+            if end:
+                emoji = text[begin:end]
+                result[emoji] = result.get(emoji, 0) + 1
+            else:
+                end = begin + 1
+
+            match = search(text, end)
+    except Exception as e:
+        logger.warning(f"Get emoji error: {e}", exc_info=True)
+
+    return result
+
+
+def get_emoji_profile(text: str) -> EmojiProfile:
+    # Get the emoji profile of the text, the length counts every emoji as 3 bytes
+    result = EmojiProfile({}, 0, 0, 0)
+
+    try:
+        if not text:
+            return result
+
+        profile = profiles.get(text)
+
+        if profile is not None:
+            return profile
+
+        counts = get_emoji(text)
+        result = profiles.set(text, EmojiProfile(
+            counts=counts,
+            total=sum(counts.values()),
+            single=max(counts.values(), default=0),
+            length=len(text.encode()) + sum((3 - len(e.encode())) * c for e, c in counts.items())
+        ))
+    except Exception as e:
+        logger.warning(f"Get emoji profile error: {e}", exc_info=True)
+
+    return result
+
+
+def init_emoji() -> bool:
+    # Build the emoji trie without the protected emojis
+    result = False
+
+    try:
+        trie = {}
+
+        for emoji in glovar.emoji_set:
+            if not emoji or emoji in glovar.emoji_protect:
+                continue
+
+            node = trie
+
+            for char in emoji:
+                node = node.setdefault(char, {})
+
+            node[""] = True
+
+        # Merge the close first characters into ranges, a long list of single characters is slow to search,
+        # the characters in the gaps are dropped by the trie
+        ranges = []
+
+        for point in sorted(ord(c) for c in trie):
+            if ranges and point - ranges[-1][1] <= 64:
+                ranges[-1][1] = point
+            else:
+                ranges.append([point, point])
+
+        glovar.emoji_trie = trie
+        glovar.emoji_starts = re.compile("[" + "".join(f"{re.escape(chr(a))}-{re.escape(chr(b))}"
+                                                       for a, b in ranges) + "]")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init emoji error: {e}", exc_info=True)
+
+    return result
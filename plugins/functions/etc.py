@@ -17,16 +17,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import re
 from datetime import datetime
-from copy import deepcopy
 from html import escape
 from json import dumps
+from queue import Empty, Queue
 from random import choice, uniform
-from re import sub
 from string import ascii_letters, digits
-from threading import Thread, Timer
+from threading import BoundedSemaphore, Timer
 from time import localtime, sleep, strftime, time
-from typing import Any, Callable, Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 from unicodedata import normalize
 
 from cryptography.fernet import Fernet
@@ -35,12 +35,28 @@ from pyrogram.errors import FloodWait
 from pyrogram.types import Contact, Message, User
 
 from .. import glovar
+from .cache import Cache
+from .emoji import get_emoji_profile
+from .executor import submit
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
-# Init Opencc
-converter = OpenCC(config="t2s.json")
+# Idle OpenCC converters, a converter is used by one thread at a time
+converters: Queue = Queue()
+converters_limit = BoundedSemaphore(4)
+
+# Recently converted texts of OpenCC
+converted = Cache(maxsize=4096)
+
+# Separator of the texts converted in one call, OpenCC keeps it
+converted_separator = "\uE000"
+
+# Characters removed by the pure mode
+pure_pattern = re.compile(r"""[^\da-zA-Z一-龥.,:'"?!~;()。，？！～@“”]""")
+
+# Recently converted texts
+t2t_cache = Cache(maxsize=4096)
 
 
 def bold(text: Any) -> str:
@@ -111,6 +127,58 @@ def code_block(text: Any) -> str:
     return result
 
 
+def convert(texts: List[str]) -> List[str]:
+    # Convert the texts to Simplified Chinese in one call of OpenCC
+    result = list(texts)
+
+    try:
+        # Check the converted texts
+        misses: Dict[str, List[int]] = {}
+
+        for i, text in enumerate(texts):
+            cached = converted.get(text)
+
+            if cached is None:
+                misses.setdefault(text, []).append(i)
+            else:
+                result[i] = cached
+
+        if not misses:
+            return result
+
+        # Convert the others
+        batch = [t for t in misses if converted_separator not in t]
+        singles = [t for t in misses if converted_separator in t]
+        converter = get_converter()
+
+        if converter is None:
+            return result
+
+        try:
+            outputs = []
+
+            if batch:
+                outputs = converter.convert(converted_separator.join(batch)).split(converted_separator)
+
+            if len(outputs) != len(batch):
+                outputs = [converter.convert(t) for t in batch]
+
+            outputs += [converter.convert(t) for t in singles]
+        finally:
+            converters.put(converter)
+
+        for text, output in zip(batch + singles, outputs):
+            for i in misses[text]:
+                result[i] = output
+
+            if len(text) <= 1024:
+                converted.set(text, output)
+    except Exception as e:
+        logger.warning(f"Convert error: {e}", exc_info=True)
+
+    return result
+
+
 def crypt_str(operation: str, text: str, key: bytes) -> str:
     # Encrypt or decrypt a string
     result = ""
@@ -188,6 +256,20 @@ def get_channel_link(message: Union[int, Message]) -> str:
     return result
 
 
+def get_converter() -> Optional[OpenCC]:
+    # Get an idle OpenCC converter, wait for one if there are enough converters
+    result = None
+
+    try:
+        result = converters.get_nowait()
+    except Empty:
+        result = OpenCC(config="t2s.json") if converters_limit.acquire(blocking=False) else converters.get()
+    except Exception as e:
+        logger.warning(f"Get converter error: {e}", exc_info=True)
+
+    return result
+
+
 def get_filename(message: Message, normal: bool = False, printable: bool = False, pure: bool = False) -> str:
     # Get file's filename
     result = ""
@@ -273,28 +355,7 @@ def get_length(text: str) -> int:
         if not text:
             return 0
 
-        emoji_dict = {}
-        emoji_set = {emoji for emoji in glovar.emoji_set if emoji in text and emoji not in glovar.emoji_protect}
-        emoji_old_set = deepcopy(emoji_set)
-
-        for emoji in emoji_old_set:
-            if any(emoji in emoji_old and emoji != emoji_old for emoji_old in emoji_old_set):
-                emoji_set.discard(emoji)
-
-        for emoji in emoji_set:
-            emoji_dict[emoji] = text.count(emoji)
-
-        length_add = 0
-
-        for emoji in emoji_dict:
-            length_add += 3 * emoji_dict[emoji]
-
-        length_remove = 0
-
-        for emoji in emoji_dict:
-            length_remove += len(emoji.encode()) * emoji_dict[emoji]
-
-        result = len(text.encode()) + length_add - length_remove
+        result = get_emoji_profile(text).length
     except Exception as e:
         logger.warning(f"Get length error: {e}", exc_info=True)
 
@@ -400,6 +461,55 @@ def get_text_user(text: str, user: User) -> str:
     return result
 
 
+def init_convert(texts: Iterable[str]) -> bool:
+    # Convert the normalized forms of the texts in one call, then t2t will find them converted
+    result = False
+
+    try:
+        if not glovar.normalize or "Hans" not in glovar.lang:
+            return False
+
+        texts = [t for t in texts if t and not (t.isascii() and not glovar.special_ascii)]
+
+        if not texts:
+            return False
+
+        table = glovar.special_table
+        convert([normalize("NFKC", t.translate(table)) for t in texts])
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init convert error: {e}", exc_info=True)
+
+    return result
+
+
+def init_special() -> bool:
+    # Merge the special characters dictionaries into one translation table
+    result = False
+
+    try:
+        table = {}
+
+        for k, v in glovar.spc_dict.items():
+            table[ord(k)] = glovar.spe_dict.get(v, v)
+
+        for k, v in glovar.spe_dict.items():
+            if ord(k) not in table:
+                table[ord(k)] = v
+
+        # Replace the table before the version
+        glovar.special_ascii = any(k < 128 for k in table)
+        glovar.special_table = table
+        glovar.special_version += 1
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init special error: {e}", exc_info=True)
+
+    return result
+
+
 def lang(text: str) -> str:
     # Get the text
     result = ""
@@ -470,34 +580,53 @@ def t2t(text: str, normal: bool, printable: bool, pure: bool = False) -> str:
         if not result:
             return ""
 
-        if glovar.normalize and normal:
-            for special in ["spc", "spe"]:
-                result = "".join(eval(f"glovar.{special}_dict").get(t, t) for t in result)
+        # Read the version before the table, the table is replaced first when it changes
+        version = glovar.special_version
+        table = glovar.special_table
+
+        if not version:
+            init_special()
+            version = glovar.special_version
+            table = glovar.special_table
+
+        # Check the converted texts
+        short = len(text) <= 1024
+        key = (text, normal, printable, pure, version)
 
+        if short:
+            cached = t2t_cache.get(key)
+
+            if cached is not None:
+                return cached
+
+        # ASCII texts are not changed by NFKC or OpenCC
+        if glovar.normalize and normal and not (result.isascii() and not glovar.special_ascii):
+            result = result.translate(table)
             result = normalize("NFKC", result)
 
-        if glovar.normalize and normal and "Hans" in glovar.lang:
-            result = converter.convert(result)
+            if "Hans" in glovar.lang:
+                result = convert([result])[0]
 
-        if printable:
+        if printable and not result.isprintable():
             result = "".join(t for t in result if t.isprintable() or t in {"\n", "\r", "\t"})
 
         if pure:
-            result = sub(r"""[^\da-zA-Z一-龥.,:'"?!~;()。，？！～@“”]""", "", result)
+            result = pure_pattern.sub("", result)
+
+        if short:
+            t2t_cache.set(key, result)
     except Exception as e:
         logger.warning(f"T2T error: {e}", exc_info=True)
 
     return result
 
 
-def thread(target: Callable, args: tuple, kwargs: dict = None, daemon: bool = True) -> bool:
-    # Call a function using thread
+def thread(target: Callable, args: tuple, kwargs: dict = None, daemon: bool = True, pool: str = "io") -> bool:
+    # Call a function using the thread pool, a task that is not daemon will be waited for on exit
     result = False
 
     try:
-        t = Thread(target=target, args=args, kwargs=kwargs, daemon=daemon)
-        t.daemon = daemon
-        result = t.start() or True
+        result = submit(pool, target, args, kwargs, daemon)
     except Exception as e:
         logger.warning(f"Thread error: {e}", exc_info=True)
 
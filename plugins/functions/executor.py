@@ -0,0 +1,205 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+from queue import Full, Queue
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict
+
+from .. import glovar
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Names of the thread pools
+pool_names = ["exchange", "io", "persistence"]
+
+# Started thread pools
+pools: Dict[str, "Pool"] = {}
+pools_lock = Lock()
+
+
+class Pool:
+    # Bounded thread pool, the workers are started when needed and kept idle afterwards
+    __slots__ = ("name", "size", "tasks", "threads", "idle", "keep", "active", "completed", "rejected",
+                 "lock", "done")
+
+    def __init__(self, name: str, size: int, limit: int):
+        self.name: str = name
+        self.size: int = size
+        self.tasks: Queue = Queue(limit)
+        self.threads: int = 0
+        self.idle: int = 0
+        self.keep: int = 0
+        self.active: int = 0
+        self.completed: int = 0
+        self.rejected: int = 0
+        self.lock: Lock = Lock()
+        self.done: Condition = Condition(self.lock)
+
+    def submit(self, target: Callable, args: tuple = (), kwargs: dict = None, daemon: bool = True) -> bool:
+        # Queue a task, apply the overflow policy when the queue is full
+        task = (target, args, kwargs or {}, daemon)
+
+        with self.lock:
+            if not self.idle and self.threads < self.size:
+                self.threads += 1
+                Thread(target=self.work, name=f"{self.name}-{self.threads}", daemon=True).start()
+
+            if not daemon:
+                self.keep += 1
+
+        try:
+            self.tasks.put_nowait(task)
+            return True
+        except Full:
+            pass
+
+        if glovar.pool_overflow == "block":
+            self.tasks.put(task)
+            return True
+
+        if glovar.pool_overflow == "caller":
+            self.run(task)
+            return True
+
+        with self.lock:
+            self.rejected += 1
+            self.finish(daemon)
+
+        logger.warning(f"Pool {self.name} rejected {getattr(target, '__name__', target)}")
+
+        return False
+
+    def run(self, task: tuple) -> None:
+        # Run a task
+        target, args, kwargs, daemon = task
+
+        with self.lock:
+            self.active += 1
+
+        try:
+            target(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Pool {self.name} task error: {e}", exc_info=True)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+                self.finish(daemon)
+
+    def finish(self, daemon: bool) -> None:
+        # Wake up the waiters when the last task that should not be dropped on exit is done, called with the lock
+        if daemon:
+            return
+
+        self.keep -= 1
+        self.keep or self.done.notify_all()
+
+    def work(self) -> None:
+        # Take the tasks one by one
+        while True:
+            with self.lock:
+                self.idle += 1
+
+            task = self.tasks.get()
+
+            with self.lock:
+                self.idle -= 1
+
+            self.run(task)
+
+    def wait(self, timeout: float = None) -> bool:
+        # Wait for the tasks that should not be dropped on exit
+        with self.lock:
+            return self.done.wait_for(lambda: not self.keep, timeout)
+
+    def stats(self) -> Dict[str, int]:
+        # Get the counters
+        return {
+            "active": self.active,
+            "queued": self.tasks.qsize(),
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+def get_pool(name: str) -> Pool:
+    # Get the thread pool, create it with the configured size at the first time
+    pool = pools.get(name)
+
+    if pool is not None:
+        return pool
+
+    with pools_lock:
+        if name not in pools:
+            pools[name] = Pool(name, eval(f"glovar.pool_{name}"), glovar.pool_queue)
+
+        return pools[name]
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    # Get the counters of all thread pools
+    result = {}
+
+    try:
+        result = {name: get_pool(name).stats() for name in pool_names}
+    except Exception as e:
+        logger.warning(f"Get pool stats error: {e}", exc_info=True)
+
+    return result
+
+
+def start_thread(target: Callable, args: tuple) -> bool:
+    # Start a dedicated thread for a long-running loop, which should not hold a pool worker
+    result = False
+
+    try:
+        t = Thread(target=target, args=args, daemon=True)
+        result = t.start() or True
+    except Exception as e:
+        logger.warning(f"Start thread error: {e}", exc_info=True)
+
+    return result
+
+
+def submit(name: str, target: Callable, args: tuple, kwargs: dict = None, daemon: bool = True) -> bool:
+    # Submit a task to the thread pool
+    result = False
+
+    try:
+        result = get_pool(name).submit(target, args, kwargs, daemon)
+    except Exception as e:
+        logger.warning(f"Submit error: {e}", exc_info=True)
+
+    return result
+
+
+def wait_pools(timeout: float) -> bool:
+    # Wait for the tasks that should not be dropped on exit
+    result = False
+
+    try:
+        # Every pool is waited for, even if an earlier one timed out
+        results = [get_pool(name).wait(timeout) for name in pool_names]
+        result = all(results)
+    except Exception as e:
+        logger.warning(f"Wait pools error: {e}", exc_info=True)
+
+    return result
@@ -21,21 +21,43 @@ import json
 import pickle
 from os import remove
 from os.path import exists
-from shutil import copyfile, move
-from time import sleep
+from shutil import move
+from time import sleep, time
 from typing import Any
 
 from pyAesCrypt import decryptFile, encryptFile
 from pyrogram import Client
 
 from .. import glovar
-from .decorators import threaded
+from ..snapshot import append_journal, apply_record, clean_journals, dump_snapshot
 from .etc import random_str
 from .telegram import download_media
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
+# Records of a journal before it is compacted into the snapshot
+journal_limit = 10000
+
+
+def copy_data(file: str) -> Any:
+    # Copy a global variable, taken under the lock which owns the data and the journal lock
+    result = None
+
+    try:
+        lock = glovar.locks.get(get_save_lock(file))
+        lock and lock.acquire()
+
+        try:
+            with glovar.locks["journal"]:
+                result = pickle.loads(pickle.dumps(eval(f"glovar.{file}")))
+        finally:
+            lock and lock.release()
+    except Exception as e:
+        logger.warning(f"Copy {file} error: {e}", exc_info=True)
+
+    return result
+
 
 def crypt_file(operation: str, file_in: str, file_out: str) -> bool:
     # Encrypt or decrypt a file
@@ -158,6 +180,50 @@ def get_new_path(extension: str = "", prefix: str = "") -> str:
     return result
 
 
+def get_save_lock(file: str) -> str:
+    # Get the name of the lock which owns the data
+    result = ""
+
+    try:
+        if file in {"channels"}:
+            result = "channel"
+        elif file in {"configs", "keywords"}:
+            result = "config"
+        elif file in {"regex_counts", "timeout_words"} or file.endswith("_words"):
+            result = "regex"
+        elif file in {"admin_ids"}:
+            result = "admin"
+        elif file in {"bad_ids", "user_ids", "watch_ids"}:
+            result = "message"
+    except Exception as e:
+        logger.warning(f"Get save lock error: {e}", exc_info=True)
+
+    return result
+
+
+def journal(file: str, op: str, path: tuple, value: Any = None) -> bool:
+    # Apply a small change to a journaled global variable, append it to the journal instead of saving the whole file
+    result = False
+
+    try:
+        if not glovar:
+            return False
+
+        with glovar.locks["journal"]:
+            record = (path, op, value)
+            apply_record(eval(f"glovar.{file}"), record)
+            base = glovar.journal_bases.get(file, 0)
+            result = append_journal(f"{glovar.PICKLE_PATH}/{file}.{base}.journal", base, record)
+            count = glovar.journal_counts[file] = glovar.journal_counts.get(file, 0) + 1
+
+        if not result or count >= journal_limit:
+            save(file)
+    except Exception as e:
+        logger.warning(f"Journal {file} error: {e}", exc_info=True)
+
+    return result
+
+
 def move_file(src: str, dst: str) -> bool:
     # Move a file
     result = False
@@ -173,22 +239,79 @@ def move_file(src: str, dst: str) -> bool:
     return result
 
 
-@threaded(daemon=False)
 def save(file: str) -> bool:
-    # Save a global variable to a file
+    # Mark a global variable as dirty, the writer will save it after the debounce window
     result = False
 
     try:
         if not glovar:
             return False
 
-        with open(f"{glovar.PICKLE_BACKUP_PATH}/{file}", "wb") as f:
-            pickle.dump(eval(f"glovar.{file}"), f)
+        with glovar.locks["file"]:
+            glovar.dirty_files.setdefault(file, time())
+            glovar.dirty_event.set()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Mark {file} error: {e}", exc_info=True)
+
+    return result
+
 
-        result = copyfile(f"{glovar.PICKLE_BACKUP_PATH}/{file}", f"{glovar.PICKLE_PATH}/{file}")
+def save_all() -> bool:
+    # Save all dirty files now, used before the program stops or restarts
+    result = False
+
+    try:
+        with glovar.locks["file"]:
+            files = list(glovar.dirty_files)
+            glovar.dirty_files.clear()
+
+        # Compact the journals
+        files += [f for f in glovar.journal_files if glovar.journal_counts.get(f) and f not in files]
+
+        for file in files:
+            save_file(file, timeout=3)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Save all error: {e}", exc_info=True)
+
+    return result
+
+
+def save_file(file: str, timeout: float = -1) -> bool:
+    # Save a global variable to a file, the snapshot is taken under the lock which owns the data
+    result = False
+
+    try:
+        if not glovar:
+            return False
+
+        with glovar.locks["save"]:
+            seq = glovar.file_seqs.get(file, 0) + 1
+            lock = glovar.locks.get(get_save_lock(file))
+            locked = lock is not None and lock.acquire(timeout=timeout)
+
+            try:
+                if file in glovar.journal_files:
+                    # Later changes are appended to a new journal based on this snapshot
+                    with glovar.locks["journal"]:
+                        data = pickle.dumps(eval(f"glovar.{file}"))
+                        glovar.journal_bases[file] = seq
+                        glovar.journal_counts[file] = 0
+                else:
+                    data = pickle.dumps(eval(f"glovar.{file}"))
+            finally:
+                locked and lock.release()
+
+            result = dump_snapshot(f"{glovar.PICKLE_PATH}/{file}", f"{glovar.PICKLE_BACKUP_PATH}/{file}", data, seq)
+
+            if result:
+                glovar.file_seqs[file] = seq
+                file in glovar.journal_files and clean_journals(glovar.PICKLE_PATH, file, seq)
     except RuntimeError:
-        sleep(1)
-        return save(file)
+        save(file)
     except Exception as e:
         logger.warning(f"Save {file} error: {e}", exc_info=True)
 
@@ -211,3 +334,31 @@ def save_regex_timeout(word: str) -> bool:
         glovar.locks["regex"].release()
 
     return result
+
+
+def save_worker() -> bool:
+    # Save the dirty files whose debounce windows have passed, one by one
+    while True:
+        try:
+            with glovar.locks["file"]:
+                now = time()
+                files = [f for f, t in glovar.dirty_files.items() if t + glovar.time_save <= now]
+                wait = min([t + glovar.time_save - now for t in glovar.dirty_files.values()], default=None)
+
+                for file in files:
+                    glovar.dirty_files.pop(file, None)
+
+                not glovar.dirty_files and glovar.dirty_event.clear()
+
+            for file in files:
+                save_file(file)
+
+            if files:
+                continue
+            elif wait is None:
+                glovar.dirty_event.wait()
+            else:
+                sleep(wait)
+        except Exception as e:
+            logger.warning(f"Save worker error: {e}", exc_info=True)
+            sleep(1)
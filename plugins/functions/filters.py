@@ -17,24 +17,61 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import re
-import re2
-from copy import deepcopy
+from hashlib import blake2b
 from string import ascii_lowercase
-from typing import Match, Optional, Union
+from time import time
+from typing import Any, Callable, Dict, Match, Optional, Pattern, Union
 
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, Message, User
 
 from .. import glovar
-from .etc import get_filename, get_forward_name, get_full_name, get_now, get_text, t2t
-from .file import save, save_regex_timeout
+from .cache import Cache
+from .context import LazyFields, get_context_spaces, get_context_text
+from .decorators import cached
+from .emoji import get_emoji_profile
+from .etc import get_full_name, get_now, t2t
+from .file import save_regex_timeout
 from .ids import init_group_id
+from .keywords import get_features, get_keyword_hits, get_keyword_index, is_feature_match, service_mask
+from .regex import check_regex_time, count_regex, get_candidates, get_patterns, get_regex_version, search_guarded
+from .store import get_user_status, get_watch
 from .telegram import get_user_full
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
+# Regex verdicts shared by all groups, keyed by the category, the ruleset version and the text's digest
+regex_verdicts = Cache(maxsize=65536, ttl=600)
+
+# Name and bio verdicts of users, keyed by the user's id and the text type
+user_verdicts = Cache(maxsize=65536, ttl=3600)
+
+# Bios of users, reused within the configured window
+user_bios = Cache(maxsize=16384, ttl=glovar.time_bio)
+
+# Getters of the keyword plan's fields, called with the plan, the message and the client,
+# the include words are compared as exact words in the class C message,
+# and the hits of the sender's name take the place of the forward name's
+keyword_fields: Dict[Any, Callable[[dict, Message, Optional[Client]], Any]] = {
+    "class_c": lambda _, m, __: is_class_c(None, None, m),
+    "equal": lambda _, m, __: glovar.configs[m.chat.id].get("equal", False),
+    "pass": lambda _, m, __: is_should_pass(m, False),
+    "pass_terminate": lambda _, m, __: is_should_pass(m, True),
+    "features": lambda _, m, __: get_features(m),
+    "text": lambda _, m, __: get_context_text(m, "text", True),
+    "filename": lambda _, m, __: get_context_text(m, "filename", True),
+    "bio": lambda _, m, c: get_keyword_bio(m, c),
+    **{("hits", s): lambda p, m, _, s=s: get_keyword_hits(m.chat.id, p[s], p["class_c"] and not p["equal"])
+       for s in ("text", "filename", "bio")},
+    **{("names", pure): lambda _, m, __, pure=pure: (get_context_text(m, "name", True, pure, pure),
+                                                     get_context_text(m, "forward", True, pure, pure))
+       for pure in (False, True)},
+    **{("hits", ("names", pure)): lambda p, m, _, pure=pure: {k: v for name in reversed(p["names", pure])
+                                                              for k, v in get_keyword_hits(m.chat.id, name).items()}
+       for pure in (False, True)}
+}
+
 
 def is_aio(_, __, ___) -> bool:
     # Check if the program is under all-in-one mode
@@ -295,29 +332,49 @@ test_group = filters.create(
 )
 
 
-def get_words(words: set, exact: bool) -> dict:
-    # Get words dict
-    result = {}
+def get_keyword_bio(message: Message, client: Client = None) -> str:
+    # Get the normalized bio of the message's sender, fetched with the client if it is not reused
+    result = ""
 
     try:
-        for word in words:
-            if word.startswith("{{") and word.endswith("}}"):
-                word = word[2:-2]
+        user = (message.new_chat_members and message.new_chat_members[0]) or message.from_user
 
-                if not word:
-                    continue
+        if not user:
+            return ""
 
-                result[word] = True
-            elif exact:
-                result[word] = True
-            else:
-                result[word] = False
+        result = t2t(get_user_bio(client, user.id), True, False)
     except Exception as e:
-        logger.warning(f"Get words error: {e}", exc_info=True)
+        logger.warning(f"Get keyword bio error: {e}", exc_info=True)
 
     return result
 
 
+def get_keyword_plan(message: Message, client: Client = None) -> LazyFields:
+    # Get the sender status, the texts and the keyword hits shared by all keywords of the message,
+    # every field is computed on the first use, so only the texts which some keyword checks are normalized,
+    # and the bio is fetched only if some keyword of the group checks it
+    return LazyFields(keyword_fields, message, client)
+
+
+def get_user_bio(client: Optional[Client], uid: int) -> str:
+    # Get the user's bio, reused within the configured window, fetched with the client if it is not reused
+    result = ""
+
+    try:
+        result = user_bios.get(uid)
+
+        if result is not None or not client:
+            return result or ""
+
+        user = get_user_full(client, uid)
+        result = user_bios.set(uid, user.about or "") if user else ""
+    except Exception as e:
+        logger.warning(f"Get user bio error: {e}", exc_info=True)
+
+    return result
+
+
+@cached
 def is_ad_text(text: str, ocr: bool, matched: str = "") -> str:
     # Check if the text is ad text
     result = ""
@@ -341,6 +398,7 @@ def is_ad_text(text: str, ocr: bool, matched: str = "") -> str:
     return result
 
 
+@cached
 def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
     # Check if the text is ban text
     result = False
@@ -384,6 +442,7 @@ def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
     return result
 
 
+@cached
 def is_bio_text(text: str) -> bool:
     # Check if the text is bio text
     result = False
@@ -437,6 +496,7 @@ def is_class_e_user(user: Union[int, User]) -> bool:
     return result
 
 
+@cached
 def is_con_text(text: str, ocr: bool) -> bool:
     # Check if the text is con text
     result = False
@@ -464,44 +524,36 @@ def is_declared_message_id(gid: int, mid: int) -> bool:
     return result
 
 
+@cached
 def is_emoji(the_type: str, text: str, message: Message = None) -> bool:
     # Check the emoji type
     result = False
 
     try:
         if message:
-            text = get_text(message)
-
-        emoji_dict = {}
-        emoji_set = {emoji for emoji in glovar.emoji_set if emoji in text and emoji not in glovar.emoji_protect}
-        emoji_old_set = deepcopy(emoji_set)
+            text = get_context_text(message, "text")
 
-        for emoji in emoji_old_set:
-            if any(emoji in emoji_old and emoji != emoji_old for emoji_old in emoji_old_set):
-                emoji_set.discard(emoji)
-
-        for emoji in emoji_set:
-            emoji_dict[emoji] = text.count(emoji)
+        profile = get_emoji_profile(text)
 
         # Check ad
         if the_type == "ad":
-            if any(emoji_dict[emoji] >= glovar.emoji_ad_single for emoji in emoji_dict):
+            if profile.single >= glovar.emoji_ad_single:
                 return True
 
-            if sum(emoji_dict.values()) >= glovar.emoji_ad_total:
+            if profile.total >= glovar.emoji_ad_total:
                 return True
 
         # Check many
         elif the_type == "many":
-            if sum(emoji_dict.values()) >= glovar.emoji_many:
+            if profile.total >= glovar.emoji_many:
                 return True
 
         # Check wb
         elif the_type == "wb":
-            if any(emoji_dict[emoji] >= glovar.emoji_wb_single for emoji in emoji_dict):
+            if profile.single >= glovar.emoji_wb_single:
                 return True
 
-            if sum(emoji_dict.values()) >= glovar.emoji_wb_total:
+            if profile.total >= glovar.emoji_wb_total:
                 return True
     except Exception as e:
         logger.warning(f"Is emoji error: {e}", exc_info=True)
@@ -522,7 +574,7 @@ def is_high_score_user(user: Union[int, User], high: bool = True) -> float:
         else:
             uid = user.id
 
-        user_status = glovar.user_ids.get(uid, {})
+        user_status = get_user_status(uid)
 
         if not user_status:
             return 0.0
@@ -540,7 +592,7 @@ def is_high_score_user(user: Union[int, User], high: bool = True) -> float:
     return result
 
 
-def is_keyword_message(message: Message) -> dict:
+def is_keyword_message(message: Message, client: Client = None) -> dict:
     # Check if the message includes keywords
     result = {}
 
@@ -563,34 +615,48 @@ def is_keyword_message(message: Message) -> dict:
         if not keywords:
             return {}
 
+        # Get the plan
+        plan = get_keyword_plan(message, client)
+        index = get_keyword_index(gid)
+        masks = index["masks"]
+        sources = index["sources"]
+        service = message.service and not message.new_chat_members
+
         # Loop keywords
         for key in keywords:
+            # Check the words
+            if key not in sources or key not in plan["hits", sources[key]]:
+                continue
+
+            # Check the features
+            if any(masks.get(key, ())) and not is_feature_match(plan["features"], masks[key]):
+                continue
+            elif service and not masks.get(key, (0, 0))[0] & service_mask:
+                continue
+
             # Config data
             modes = keywords[key]["modes"]
             actions = keywords[key]["actions"]
             target = keywords[key]["target"]
-            class_c_message = is_class_c(None, None, message)
-            should_pass = is_should_pass(message, False)
-            should_pass_terminate = is_should_pass(message, True)
 
             # Check target
-            if target == "member" and class_c_message:
+            if target == "member" and plan["class_c"]:
                 continue
-            elif target == "admin" and not class_c_message:
+            elif target == "admin" and not plan["class_c"]:
                 continue
-            elif is_terminate_actions(actions) and is_should_pass(message):
+            elif is_terminate_actions(actions) and plan["pass"]:
                 continue
 
             # Get result
-            if ((should_pass_terminate and "name" in modes and "forward" not in modes and not message.forward_date)
-                    or (should_pass and "forward" in modes)):
+            if (("name" in modes and "forward" not in modes and not message.forward_date and plan["pass_terminate"])
+                    or ("forward" in modes and plan["pass"])):
                 continue
-            elif "name" in modes or "join" in modes:
-                result = is_keyword_name(message, key)
+            elif ("name" in modes or "join" in modes) and "bio" not in modes:
+                result = is_keyword_name(message, key, plan)
             elif "forward" in modes:
-                result = is_keyword_text(message, key, True)
+                result = is_keyword_text(message, key, True, plan)
             else:
-                result = is_keyword_text(message, key)
+                result = is_keyword_text(message, key, False, plan)
 
             # Check result
             if result:
@@ -601,13 +667,14 @@ def is_keyword_message(message: Message) -> dict:
     return result
 
 
-def is_keyword_name(message: Message, key: str) -> dict:
+def is_keyword_name(message: Message, key: str, plan: LazyFields = None) -> dict:
     # Check if the message's sender name includes keywords
     result = {}
 
     try:
         # Basic data
         gid = message.chat.id
+        plan = get_keyword_plan(message) if plan is None else plan
         match = ""
 
         # Get keywords
@@ -619,28 +686,21 @@ def is_keyword_name(message: Message, key: str) -> dict:
 
         # Get modes
         modes = keyword["modes"]
-        exact = "exact" in modes
-        case = "case" in modes
         join = "join" in modes
         pure = "pure" in modes
         forward = "forward" in modes
-        regex = "regex" in modes
 
         # Check join status
         if join and not message.new_chat_members:
             return {}
 
         # Get names
-        user_name = get_full_name(message.from_user, True, pure, pure)
-        forward_name = get_forward_name(message, True, pure, pure)
+        user_name, forward_name = plan["names", pure]
 
         # Check the forward name
         if forward and not forward_name:
             return {}
 
-        # Get words
-        words = get_words(keyword["words"], exact)
-
         # Get name list
         if forward:
             names = [forward_name]
@@ -652,13 +712,10 @@ def is_keyword_name(message: Message, key: str) -> dict:
             if not name:
                 continue
 
-            for word in words:
-                match = is_keyword_string(word, name, words[word], case, regex)
-
-                if match:
-                    break
+            words = get_keyword_hits(gid, name).get(key, [])
 
-            if match:
+            if words:
+                match = words[0]
                 break
 
         # Check the match
@@ -681,37 +738,7 @@ def is_keyword_name(message: Message, key: str) -> dict:
     return result
 
 
-def is_keyword_string(word: str, text: str, exact: bool, case: bool, regex: bool) -> str:
-    # Check if the keyword match the string
-    result = ""
-
-    try:
-        if not text or not text.strip():
-            return ""
-
-        text = text.strip()
-        origin = word
-
-        if regex and re2.search(word, text):
-            return origin
-        elif regex:
-            return ""
-
-        if not case:
-            word = word.lower()
-            text = text.lower()
-
-        if exact and word == text:
-            return origin
-        elif not exact and word in text:
-            return origin
-    except Exception as e:
-        logger.warning(f"Is keyword string error: {e}", exc_info=True)
-
-    return result
-
-
-def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
+def is_keyword_text(message: Message, key: str, forward: bool = False, plan: LazyFields = None) -> dict:
     # Check if the message includes keywords
     result = {}
 
@@ -719,7 +746,8 @@ def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
         # Basic data
         gid = message.chat.id
         mid = None
-        class_c_message = is_class_c(None, None, message)
+        plan = get_keyword_plan(message) if plan is None else plan
+        class_c_message = plan["class_c"]
         match = ""
 
         # Check the message
@@ -734,27 +762,29 @@ def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
             return {}
 
         # Get config
-        equal_mode = glovar.configs[gid].get("equal", False)
+        equal_mode = plan["equal"]
 
         # Get modes
         modes = keyword["modes"]
-        exact = "exact" in modes or (class_c_message and not equal_mode)
-        case = "case" in modes
         regex = "regex" in modes
 
         # Get text
-        message_text = get_text(message, True)
+        if "filename" in modes:
+            source = "filename"
+        elif "bio" in modes:
+            source = "bio"
+        else:
+            source = "text"
+
+        message_text = plan[source]
 
         # Check the text
         if not message_text:
             return {}
 
-        # Get words
-        words = get_words(keyword["words"], exact)
-
-        # Get match result
-        for word in words:
-            match = is_keyword_string(word, message_text, words[word], case, regex)
+        # Get match result, the hits are shared by all keywords which check the text
+        for word in plan["hits", source].get(key, []):
+            match = word
 
             if match and not equal_mode and class_c_message and regex and message_text.lower() != word.lower():
                 match = ""
@@ -804,6 +834,7 @@ def is_keyworded_user(gid: int, key: str, uid: int) -> bool:
     return result
 
 
+@cached
 def is_nm_text(text: str) -> bool:
     # Check if the text is nm text
     result = False
@@ -832,19 +863,19 @@ def is_nospam_message(message: Message) -> bool:
             return False
 
         # Check the forward from name
-        forward_name = get_forward_name(message, True, True, True)
+        forward_name = get_context_text(message, "forward", True, True, True)
 
         if forward_name and is_nm_text(forward_name):
             return True
 
         # Check the user's name
-        name = get_full_name(message.from_user, True, True, True)
+        name = get_context_text(message, "name", True, True, True)
 
-        if name and is_nm_text(name):
+        if name and is_user_text(message.from_user.id, "name", name):
             return True
 
         # Check the text
-        message_text = get_text(message, True, True)
+        message_text = get_context_text(message, "text", True, True)
 
         if is_ban_text(message_text, False):
             return True
@@ -853,7 +884,7 @@ def is_nospam_message(message: Message) -> bool:
             return True
 
         # File name
-        filename = get_filename(message, True, True)
+        filename = get_context_text(message, "filename", True, True)
 
         if is_ban_text(filename, False):
             return True
@@ -888,18 +919,16 @@ def is_nospam_join(client: Client, gid: int, user: User) -> bool:
         # Check name
         name = get_full_name(user, True, True, True)
 
-        if name and is_nm_text(name):
+        if name and is_user_text(uid, "name", name):
             return True
 
         # Check bio
-        user = get_user_full(client, uid)
+        bio = get_user_bio(client, uid)
 
-        if not user or not user.about:
-            bio = ""
-        else:
-            bio = t2t(user.about, True, True, True)
+        if bio:
+            bio = t2t(bio, True, True, True)
 
-        if bio and is_bio_text(bio):
+        if bio and is_user_text(uid, "bio", bio):
             return True
     except Exception as e:
         logger.warning(f"Is nospam join error: {e}", exc_info=True)
@@ -925,33 +954,89 @@ def is_user_class_d(gid: int, user: User) -> bool:
     return result
 
 
+@cached
+def is_user_text(uid: int, the_type: str, text: str) -> bool:
+    # Check if the user's name or bio is nm or bio text, cached by the user
+    result = False
+
+    try:
+        key = (uid, the_type)
+        version = get_regex_version()
+        verdict = user_verdicts.get(key)
+
+        if verdict is not None and verdict[0] == text and verdict[1] == version:
+            return verdict[2]
+
+        if the_type == "name":
+            result = is_nm_text(text)
+        elif the_type == "bio":
+            result = is_bio_text(text)
+
+        user_verdicts.set(key, (text, version, result))
+    except Exception as e:
+        logger.warning(f"Is user text error: {e}", exc_info=True)
+
+    return result
+
+
 def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = False) -> Optional[Match]:
     # Check if the text hit the regex rules
     result = None
 
     try:
-        if text:
-            if not again:
-                text = re.sub(r"\s{2,}", " ", text)
-            elif " " in text:
-                text = re.sub(r"\s", "", text)
-            else:
-                return None
-        else:
+        if not text:
+            return None
+
+        text = get_context_spaces(text, again)
+
+        if not text:
             return None
 
         with glovar.locks["regex"]:
-            words = list(eval(f"glovar.{word_type}_words"))
+            patterns = get_patterns(word_type)
+            matcher = glovar.matcher
+            version = glovar.regex_versions.get(word_type, 0)
 
-        for word in words:
-            if word in glovar.timeout_words:
-                continue
+        # Check the verdict of the same text from other messages
+        key = (word_type, version, len(glovar.timeout_words), ocr, again,
+               blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        verdict = regex_verdicts.get(key)
 
-            if ocr and "(?# nocr)" in word:
-                continue
+        # The verdict is the rule which hit the text, "" for none, or True for the result of trying again
+        if verdict == "":
+            return None
+        elif verdict is True:
+            return is_regex_text(word_type, text, ocr, True)
+        elif verdict and glovar.compiled.get(word_type, {}).get(verdict):
+            try:
+                result = is_regex_string(verdict, glovar.compiled[word_type][verdict], text)
+            except TimeoutError:
+                save_regex_timeout(verdict)
+
+            if result:
+                count_regex(word_type, verdict)
+                return result
+
+        # Skip the rules which the multi matcher has excluded
+        patterns = get_candidates(matcher, word_type, text, patterns)
+        patterns = [(w, p) for w, p in patterns
+                    if p and w not in glovar.timeout_words and not (ocr and "(?# nocr)" in w)]
+
+        # Check the suspect rules in the guarded workers, then get the match of the hit rule in the current process,
+        # the rules which the workers failed to check are matched in the current process as well
+        suspects = glovar.guard and [w for w, _ in patterns if w in glovar.suspect_words]
+
+        if suspects:
+            hit, timeouts, unchecked = search_guarded(suspects, text)
+            skipped = set(suspects) - set(unchecked) - {hit}
+            patterns = [(w, p) for w, p in patterns if w not in skipped]
 
+            for word in timeouts:
+                save_regex_timeout(word)
+
+        for word, pattern in patterns:
             try:
-                result = is_regex_string(word, text)
+                result = is_regex_string(word, pattern, text)
             except TimeoutError:
                 save_regex_timeout(word)
 
@@ -959,34 +1044,30 @@ def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = Fa
             if not result:
                 continue
 
-            count = eval(f"glovar.{word_type}_words").get(word, 0)
-            count += 1
-            eval(f"glovar.{word_type}_words")[word] = count
-            save(f"{word_type}_words")
+            count_regex(word_type, word)
+            regex_verdicts.set(key, word)
 
             return result
 
         # Try again
-        return is_regex_text(word_type, text, ocr, True)
+        result = is_regex_text(word_type, text, ocr, True)
+        regex_verdicts.set(key, "" if again or not result else True)
     except Exception as e:
         logger.warning(f"Is regex text error: {e}", exc_info=True)
 
     return result
 
 
-def is_regex_string(word: str, text: str) -> Optional[Match]:
+def is_regex_string(word: str, pattern: Pattern, text: str) -> Optional[Match]:
     # Check if the text hit the regex rules
     result = None
 
     try:
-        begin = get_now()
-        result = re.search(word, text, re.I | re.S | re.M)
-        end = get_now()
-
-        if end - begin < 5:
-            return result
-
-        raise TimeoutError
+        begin = time()
+        result = pattern.search(text)
+        check_regex_time(word, time() - begin)
+    except TimeoutError:
+        raise
     except Exception as e:
         logger.warning(f"Is regex string error: {e}", exc_info=True)
 
@@ -1010,7 +1091,7 @@ def is_rm_text(message: Message) -> bool:
             return False
 
         # Get the message text
-        message_text = get_text(message)
+        message_text = get_context_text(message, "text")
 
         # Check the message_text
         if not is_regex_text("rm", message_text):
@@ -1095,7 +1176,7 @@ def is_watch_user(user: Union[int, User], the_type: str, now: int = 0) -> bool:
             uid = user.id
 
         now = now or get_now()
-        until = glovar.watch_ids[the_type].get(uid, 0)
+        until = get_watch(the_type, uid)
         result = now < until
     except Exception as e:
         logger.warning(f"Is watch user error: {e}", exc_info=True)
@@ -1103,6 +1184,7 @@ def is_watch_user(user: Union[int, User], the_type: str, now: int = 0) -> bool:
     return result
 
 
+@cached
 def is_wb_text(text: str, ocr: bool) -> bool:
     # Check if the text is wb text
     result = False
@@ -17,7 +17,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from time import sleep
 from typing import List, Optional, Union
 
 from pyrogram import Client
@@ -26,9 +25,11 @@ from pyrogram.types import Chat, ChatMember, InlineKeyboardMarkup, InlineKeyboar
 from .. import glovar
 from .decorators import threaded
 from .etc import code, lang, mention_id, mention_text, thread
-from .file import save
+from .file import journal, save
 from .ids import init_group_id
+from .keywords import reset_keyword_index
 from .markup import get_text_and_markup
+from .store import clear_group
 from .telegram import (delete_messages, get_chat, get_chat_member, leave_chat, pin_chat_message, send_message,
                        unpin_all_chat_messages, unpin_chat_message)
 
@@ -136,11 +137,8 @@ def leave_group(client: Client, gid: int, reason: str = "") -> bool:
         glovar.flooded_ids.discard(gid)
         save("flooded_ids")
 
-        glovar.member_ids.pop(gid, set())
-        save("member_ids")
-
-        glovar.message_ids.pop(gid, {})
-        save("message_ids")
+        clear_group(gid)
+        journal("message_ids", "pop", (gid,))
 
         glovar.pinned_ids.pop(gid, 0)
         save("pinned_ids")
@@ -156,6 +154,7 @@ def leave_group(client: Client, gid: int, reason: str = "") -> bool:
 
         glovar.keywords.pop(gid, {})
         save("keywords")
+        reset_keyword_index(gid)
 
         glovar.ots.pop(gid, {})
         save("ots")
@@ -170,7 +169,6 @@ def leave_group(client: Client, gid: int, reason: str = "") -> bool:
         glovar.declared_message_ids.pop(gid, set())
         glovar.keyworded_ids.pop(gid, {})
         glovar.members.pop(gid, {})
-        glovar.welcomed_ids.pop(gid, set())
 
         result = True
     except Exception as e:
@@ -275,9 +273,6 @@ def pin_cancel(client: Client, gid: int, hid: str, mid: int = 0) -> Union[bool,
         # Record current pinned message
         oid = chat.pinned_message.message_id
 
-        # Avoid flooding
-        sleep(1)
-
         # Check hid
         if glovar.hold_ids.get(gid, "") != hid:
             return False
@@ -289,9 +284,6 @@ def pin_cancel(client: Client, gid: int, hid: str, mid: int = 0) -> Union[bool,
         if not r:
             return False
 
-        # Avoid flooding
-        sleep(1)
-
         # Check hid
         if glovar.hold_ids.get(gid, "") != hid:
             return False
@@ -20,7 +20,8 @@ import logging
 from copy import deepcopy
 
 from .. import glovar
-from .file import save
+from .file import journal, save
+from .store import init_user
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -44,13 +45,11 @@ def init_group_id(gid: int) -> bool:
             glovar.admin_ids[gid] = set()
             save("admin_ids")
 
-        if glovar.member_ids.get(gid) is None:
-            glovar.member_ids[gid] = set()
-            save("member_ids")
+        if not glovar.sqlite and glovar.member_ids.get(gid) is None:
+            journal("member_ids", "set", (gid,), set())
 
         if glovar.message_ids.get(gid) is None:
-            glovar.message_ids[gid] = deepcopy(glovar.default_message_data)
-            save("message_ids")
+            journal("message_ids", "set", (gid,), deepcopy(glovar.default_message_data))
 
         if glovar.trust_ids.get(gid) is None:
             glovar.trust_ids[gid] = set()
@@ -89,7 +88,7 @@ def init_group_id(gid: int) -> bool:
         if glovar.members.get(gid) is None:
             glovar.members[gid] = {}
 
-        if glovar.welcomed_ids.get(gid) is None:
+        if not glovar.sqlite and glovar.welcomed_ids.get(gid) is None:
             glovar.welcomed_ids[gid] = set()
 
         result = True
@@ -104,13 +103,7 @@ def init_user_id(uid: int) -> bool:
     result = False
 
     try:
-        if glovar.user_ids.get(uid) is not None:
-            return True
-
-        glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-        save("user_ids")
-
-        result = True
+        result = init_user(uid)
     except Exception as e:
         logger.warning(f"Init user id {uid} error: {e}", exc_info=True)
 
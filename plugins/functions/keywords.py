@@ -0,0 +1,427 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re2
+from collections import deque
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Set, Tuple, Union
+
+from pyrogram.types import Message
+
+from .. import glovar
+from .decorators import cached
+from .etc import get_filename
+from .store import is_member
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Lock of building and resetting the indexes
+indexes_lock = Lock()
+
+# Message features, a keyword applies only if the message has all of its condition modes,
+# and any of its media kind modes
+feature_kinds: List[str] = ["media", "audio", "document", "photo", "sticker", "animation", "video", "voice",
+                            "video_note", "contact", "location", "venue", "web_page", "poll", "dice", "game", "score"]
+feature_conditions: List[str] = ["forward", "user", "channel", "reply", "discuss", "strange", "mentioned",
+                                 "service", "join", "leave", "edit", "url", "filename", "caption",
+                                 "via_bot", "reply_markup"]
+feature_bits: Dict[str, int] = {mode: 1 << i for i, mode in enumerate(feature_kinds + feature_conditions)}
+
+# Service messages other than joins are checked only by the keywords with these condition modes
+service_mask: int = feature_bits["service"] | feature_bits["leave"]
+
+# Word count under which the substring checks of every word are faster than one pass of the automaton
+automaton_min: int = 100
+
+
+class Automaton:
+    # Aho-Corasick automaton which finds all the words included by the text in one pass,
+    # a few words are checked one by one instead
+    __slots__ = ("words", "goto", "fail", "out")
+
+    def __init__(self, words: Iterable[str]):
+        self.words: List[str] = list(words)
+        self.goto: List[Dict[str, int]] = [{}]
+        self.out: List[List[str]] = [[]]
+
+        if len(self.words) < automaton_min:
+            self.fail = [0]
+            return
+
+        # Build the trie
+        for word in self.words:
+            node = 0
+
+            for char in word:
+                child = self.goto[node].get(char)
+
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.out.append([])
+
+                node = child
+
+            self.out[node].append(word)
+
+        # Build the failure links in breadth-first order
+        self.fail: List[int] = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+
+        while queue:
+            node = queue.popleft()
+
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text: str) -> Set[str]:
+        # Get all the words included by the text
+        if len(self.words) < automaton_min:
+            return {word for word in self.words if word in text}
+
+        result = set()
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        node = 0
+
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+
+            node = goto[node].get(char, 0)
+
+            if out[node]:
+                result.update(out[node])
+
+        return result
+
+
+def get_keyword_index(gid: int) -> Dict[str, Any]:
+    # Get the compiled keyword index of the group, build it if necessary
+    result = {}
+
+    try:
+        result = glovar.keyword_indexes.get(gid)
+
+        if result is not None:
+            return result
+
+        with indexes_lock:
+            result = glovar.keyword_indexes.get(gid)
+
+            if result is None:
+                result = glovar.keyword_indexes[gid] = init_keyword_index(gid)
+    except Exception as e:
+        logger.warning(f"Get keyword index error: {e}", exc_info=True)
+
+    return result or {}
+
+
+def get_keyword_memory() -> Tuple[int, int]:
+    # Get the count of the built indexes and the total program size of their regex words
+    result = (0, 0)
+
+    try:
+        with indexes_lock:
+            indexes = list(glovar.keyword_indexes.values())
+
+        result = (len(indexes), sum(index.get("memory", 0) for index in indexes if index))
+    except Exception as e:
+        logger.warning(f"Get keyword memory error: {e}", exc_info=True)
+
+    return result
+
+
+@cached
+def get_keyword_hits(gid: int, text: str, exact: bool = False) -> Dict[str, List[str]]:
+    # Get the keys and the words which match the text, include words are compared as exact words if exact is True
+    result = {}
+
+    try:
+        text = text and text.strip()
+
+        if not text:
+            return {}
+
+        index = get_keyword_index(gid)
+
+        if not index:
+            return {}
+
+        # Literal words
+        for case in (True, False):
+            words = index["words"][case]
+
+            if not words:
+                continue
+
+            target = text if case else text.lower()
+            found = {target} if exact else index["automatons"][case].search(target) | {target}
+
+            for word in found:
+                for key, (origin, word_exact) in words.get(word, {}).items():
+                    if word_exact and word != target:
+                        continue
+
+                    result.setdefault(key, []).append(origin)
+
+        # Regex words
+        if index["set"] is not None:
+            for i in index["set"].Match(text) or []:
+                key, origin = index["regex"][i]
+                result.setdefault(key, []).append(origin)
+
+        for key, pattern in index["fallback"]:
+            if pattern.search(text):
+                result.setdefault(key, []).append(pattern.pattern)
+    except Exception as e:
+        logger.warning(f"Get keyword hits error: {e}", exc_info=True)
+
+    return result
+
+
+def get_keyword_source(modes: Set[str]) -> Union[str, Tuple[str, bool]]:
+    # Get the text of the message which the keyword of the modes checks
+    result = "text"
+
+    try:
+        if ("name" in modes or "join" in modes) and "bio" not in modes:
+            result = ("names", "pure" in modes)
+        elif "filename" in modes:
+            result = "filename"
+        elif "bio" in modes:
+            result = "bio"
+    except Exception as e:
+        logger.warning(f"Get keyword source error: {e}", exc_info=True)
+
+    return result
+
+
+@cached
+def get_features(message: Message) -> int:
+    # Get the feature bits of the message
+    result = 0
+
+    try:
+        # Basic data
+        gid = message.chat.id
+        uid = message.from_user and message.from_user.id
+        reply = message.reply_to_message
+        origin = message.forward_from_chat
+        entities = (message.entities or []) + (message.caption_entities or [])
+
+        features = {
+            "media": message.media,
+            "audio": message.audio,
+            "document": message.document,
+            "photo": message.photo,
+            "sticker": message.sticker,
+            "animation": message.animation,
+            "video": message.video,
+            "voice": message.voice,
+            "video_note": message.video_note,
+            "contact": message.contact,
+            "location": message.location,
+            "venue": message.venue,
+            "web_page": message.web_page,
+            "poll": message.poll,
+            "dice": message.dice,
+            "game": message.game,
+            "score": message.game_high_score,
+            "forward": message.forward_date,
+            "user": message.forward_from or message.forward_sender_name,
+            "channel": origin and origin.type == "channel",
+            "reply": reply,
+            "discuss": reply and reply.from_user and reply.from_user.id == 777000,
+            "strange": uid and not is_member(gid, uid),
+            "mentioned": message.mentioned,
+            "service": message.service,
+            "join": message.new_chat_members,
+            "leave": message.left_chat_member,
+            "edit": message.edit_date,
+            "url": any(e.type in {"url", "text_link"} for e in entities),
+            "filename": get_filename(message),
+            "caption": message.caption,
+            "via_bot": message.via_bot,
+            "reply_markup": message.reply_markup
+        }
+
+        for mode, value in features.items():
+            if value:
+                result |= feature_bits[mode]
+    except Exception as e:
+        logger.warning(f"Get features error: {e}", exc_info=True)
+
+    return result
+
+
+def get_feature_masks(modes: Set[str]) -> Tuple[int, int]:
+    # Get the masks of the condition features and the media kind features of the modes
+    result = (0, 0)
+
+    try:
+        conditions = 0
+        kinds = 0
+
+        for mode in modes:
+            if mode in feature_conditions:
+                conditions |= feature_bits[mode]
+            elif mode in feature_kinds:
+                kinds |= feature_bits[mode]
+
+        result = (conditions, kinds)
+    except Exception as e:
+        logger.warning(f"Get feature masks error: {e}", exc_info=True)
+
+    return result
+
+
+def init_keyword_index(gid: int) -> Dict[str, Any]:
+    # Build the compiled keyword index of the group
+    result = {}
+
+    try:
+        keywords = glovar.keywords.get(gid, {}).get("kws", {})
+        words: Dict[bool, Dict[str, Dict[str, tuple]]] = {True: {}, False: {}}
+        regex_set = None
+        regex: List[tuple] = []
+        fallback: List[tuple] = []
+        masks: Dict[str, Tuple[int, int]] = {}
+        compiled: Dict[str, Any] = {}
+        sources: Dict[str, Union[str, Tuple[str, bool]]] = {}
+        memory = 0
+
+        for key in list(keywords):
+            modes = keywords[key]["modes"]
+            case = "case" in modes
+            masks[key] = get_feature_masks(modes)
+            sources[key] = get_keyword_source(modes)
+
+            for word in list(keywords[key]["words"]):
+                exact = "exact" in modes
+
+                if word.startswith("{{") and word.endswith("}}"):
+                    word = word[2:-2]
+                    exact = True
+
+                if not word:
+                    continue
+
+                # Regex words
+                if "regex" in modes:
+                    regex.append((key, word))
+                    continue
+
+                # Literal words, the include word is kept if the key has both forms
+                target = word if case else word.lower()
+                entries = words[case].setdefault(target, {})
+
+                if key not in entries or entries[key][1]:
+                    entries[key] = (word, exact)
+
+        # Compile the regex words one by one to validate them, then compile the valid words into one set,
+        # the compiled objects are kept only for the fallback words
+        if regex:
+            options = re2.Options()
+            options.max_mem = 64 << 20
+            regex_set = re2.Set.SearchSet(options)
+            added = []
+
+            for key, word in regex:
+                try:
+                    pattern = compiled.get(word) or re2.compile(word)
+                except Exception as e:
+                    logger.info(f"Compile keyword {word} error: {e}")
+                    continue
+
+                compiled[word] = pattern
+
+                try:
+                    regex_set.Add(word)
+                    added.append((key, word))
+                except Exception as e:
+                    logger.info(f"Add {word} to the keyword set error: {e}")
+                    fallback.append((key, pattern))
+
+            regex_set.Compile()
+            regex = added
+
+            # Account the programs the index holds, the set is one program of the alternation of its words,
+            # which is measured by compiling the same alternation, the binding does not expose the size of the set
+            memory = sum(p.programsize for p in {pattern.pattern: pattern for _, pattern in fallback}.values())
+
+            try:
+                if added:
+                    alternation = "|".join(f"(?:{word})" for word in dict.fromkeys(word for _, word in added))
+                    memory += re2.compile(alternation, options).programsize
+            except Exception as e:
+                logger.info(f"Measure the keyword set error: {e}")
+
+        # Only the words which are included by some keys need the automatons
+        includes = {case: [w for w in words[case] if not all(e[1] for e in words[case][w].values())]
+                    for case in (True, False)}
+
+        result = {
+            "words": words,
+            "automatons": {case: Automaton(includes[case]) for case in (True, False)},
+            "set": regex_set,
+            "regex": regex,
+            "fallback": fallback,
+            "masks": masks,
+            "sources": sources,
+            "memory": memory
+        }
+    except Exception as e:
+        logger.warning(f"Init keyword index error: {e}", exc_info=True)
+
+    return result
+
+
+def is_feature_match(features: int, masks: Tuple[int, int]) -> bool:
+    # Check if the features meet the masks of the keyword
+    conditions, kinds = masks
+    return features & conditions == conditions and (not kinds or bool(features & kinds))
+
+
+def reset_keyword_index(gid: int = 0) -> bool:
+    # Drop the compiled keyword index of the group, or of all groups, it will be rebuilt when used
+    result = False
+
+    try:
+        with indexes_lock:
+            if gid:
+                glovar.keyword_indexes.pop(gid, None)
+            else:
+                glovar.keyword_indexes.clear()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Reset keyword index error: {e}", exc_info=True)
+
+    return result
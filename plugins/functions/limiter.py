@@ -0,0 +1,245 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+from threading import Lock, local
+from time import monotonic, sleep
+from typing import Dict, Set
+
+from .. import glovar
+from .cache import Cache
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Tokens per second and bucket capacities, Telegram allows about 20 messages per minute in a group,
+# 1 message per second in a private chat and 30 messages per second in total
+rate_group = 20 / 60
+rate_private = 1.0
+rate_global = 30.0
+
+# Part of a bucket kept for the higher priorities
+reserves: Dict[str, float] = {
+    "high": 0.0,
+    "normal": 0.25,
+    "low": 0.5
+}
+
+# Priorities of the action kinds
+priorities: Dict[str, str] = {
+    "evidence": "high",
+    "keyword": "high",
+    "terminate": "high",
+    "tip": "low"
+}
+
+# Priority and the prepaid tokens of the current thread
+current = local()
+
+# Buckets of the chats
+buckets = Cache(65536)
+buckets_lock = Lock()
+
+
+class Bucket:
+    # Token bucket, paused until a time after a FloodWait, should be used with the buckets lock
+    __slots__ = ("rate", "capacity", "tokens", "stamp", "until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.stamp: float = monotonic()
+        self.until: float = 0.0
+
+    def get_wait(self, reserve: float, now: float) -> float:
+        # Get the seconds to wait before a token above the reserve is available
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        floor = min(self.capacity * reserve + 1, self.capacity)
+
+        return max(self.until - now, (floor - self.tokens) / self.rate, 0.0)
+
+
+# Bucket shared by all chats
+bucket_global = Bucket(rate_global, rate_global)
+
+
+def get_bucket(cid: int) -> Bucket:
+    # Get the bucket of the chat, should be used with the buckets lock
+    result = buckets.get(cid)
+
+    if result is not None:
+        return result
+
+    if cid in get_channels():
+        result = Bucket(rate_global, rate_global)
+    elif cid < 0:
+        result = Bucket(rate_group, rate_group * 60)
+    else:
+        result = Bucket(rate_private, rate_private)
+
+    return buckets.set(cid, result)
+
+
+def get_channels() -> Set[int]:
+    # Get the channels of the project, only the global bucket limits them, their own buckets keep the FloodWait pause
+    return {glovar.compromise_channel_id, glovar.critical_channel_id, glovar.debug_channel_id,
+            glovar.exchange_channel_id, glovar.hide_channel_id, glovar.tip_channel_id} - {0}
+
+
+def get_paid() -> Dict[int, int]:
+    # Get the prepaid tokens of the current thread
+    result = getattr(current, "paid", None)
+
+    if result is None:
+        result = current.paid = {}
+
+    return result
+
+
+def get_priority(cid: int) -> str:
+    # Get the priority of sending to the chat
+    result = "normal"
+
+    try:
+        if cid == glovar.debug_channel_id:
+            return "low"
+
+        result = getattr(current, "priority", None) or result
+    except Exception as e:
+        logger.warning(f"Get priority error: {e}", exc_info=True)
+
+    return result
+
+
+def get_token(cid: int) -> float:
+    # Take a token of the chat and the global bucket, return the seconds to wait if there is no token now
+    result = 0.0
+
+    try:
+        reserve = reserves[get_priority(cid)]
+
+        with buckets_lock:
+            bucket = get_bucket(cid)
+            now = monotonic()
+            result = max(bucket.get_wait(reserve, now), bucket_global.get_wait(reserve, now))
+
+            if result:
+                return result
+
+            bucket.tokens -= 1
+            bucket_global.tokens -= 1
+    except Exception as e:
+        logger.warning(f"Get token error: {e}", exc_info=True)
+
+    return result
+
+
+def pause_chat(cid: int, secs: float) -> bool:
+    # Pause the bucket of the chat after a FloodWait
+    result = False
+
+    try:
+        with buckets_lock:
+            bucket = get_bucket(cid)
+            bucket.until = max(bucket.until, monotonic() + secs)
+            bucket.tokens = 0.0
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Pause chat error: {e}", exc_info=True)
+
+    return result
+
+
+def prepay_token(cid: int) -> float:
+    # Take a token of the chat for a later send of the current thread, return the seconds to wait if there is no token
+    result = 0.0
+
+    try:
+        result = get_token(cid)
+
+        if result:
+            return result
+
+        paid = get_paid()
+        paid[cid] = paid.get(cid, 0) + 1
+    except Exception as e:
+        logger.warning(f"Prepay token error: {e}", exc_info=True)
+
+    return result
+
+
+def refund_tokens() -> bool:
+    # Give back the prepaid tokens which the current thread did not use
+    result = False
+
+    try:
+        paid = get_paid()
+
+        with buckets_lock:
+            for cid, count in paid.items():
+                bucket = get_bucket(cid)
+                bucket.tokens = min(bucket.capacity, bucket.tokens + count)
+                bucket_global.tokens = min(bucket_global.capacity, bucket_global.tokens + count)
+
+        paid.clear()
+        result = True
+    except Exception as e:
+        logger.warning(f"Refund tokens error: {e}", exc_info=True)
+
+    return result
+
+
+def set_priority(kind: str) -> bool:
+    # Set the priority of the current thread by the action kind
+    result = False
+
+    try:
+        current.priority = priorities.get(kind)
+        result = True
+    except Exception as e:
+        logger.warning(f"Set priority error: {e}", exc_info=True)
+
+    return result
+
+
+def wait_token(cid: int) -> bool:
+    # Wait until a token of the chat is taken, a token prepaid by the current thread is used first
+    result = False
+
+    try:
+        paid = get_paid()
+
+        if paid.get(cid):
+            paid[cid] -= 1
+            return True
+
+        wait = get_token(cid)
+
+        while wait:
+            sleep(wait)
+            wait = get_token(cid)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Wait token error: {e}", exc_info=True)
+
+    return result
@@ -0,0 +1,31 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+from threading import RLock
+
+from .. import glovar
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def get_group_lock(gid: int) -> RLock:
+    # Get the lock of the group, groups share a fixed number of locks, see glovar.locks for the order
+    return glovar.group_locks[hash(gid) % len(glovar.group_locks)]
@@ -21,6 +21,8 @@ from os import getcwd, getpid, kill
 from signal import SIGABRT
 from subprocess import run
 
+from .file import save_all
+
 # Enable logging
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,7 @@ def restart_program() -> bool:
     result = False
 
     try:
+        save_all()
         service_name = getcwd().split("/")[-1]
         run(f"systemctl --user restart {service_name}", shell=True)
         kill(getpid(), SIGABRT)
@@ -44,6 +47,7 @@ def update_program() -> bool:
     result = False
 
     try:
+        save_all()
         service_name = getcwd().split("/")[-1]
         run(f"bash ~/scp-079/scripts/update.sh {service_name}", shell=True)
         run(f"git pull", shell=True)
@@ -18,7 +18,6 @@
 
 import logging
 import pickle
-from copy import deepcopy
 from json import loads
 from typing import Any
 
@@ -28,10 +27,16 @@ from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 from .. import glovar
 from .channel import get_debug_text, share_data
 from .config import get_config_text
-from .etc import code, crypt_str, general_link, get_int, get_now, get_text, lang, mention_id, mention_text, thread
+from .etc import (code, crypt_str, general_link, get_int, get_now, get_text, init_special, lang, mention_id, mention_text,
+                  thread)
 from .file import crypt_file, data_to_file, delete_file, get_new_path, get_downloaded_path, save
 from .group import get_member, leave_group
 from .ids import init_group_id, init_user_id
+from .keywords import reset_keyword_index
+from .locks import get_group_lock
+from .regex import compile_regex, compile_regex_set
+from .store import (add_member, clear_users, clear_watches, import_store, is_welcomed, remove_watch, reset_user,
+                    set_score, set_watch)
 from .telegram import send_message, send_report_message
 from .timers import update_admins
 from .tip import tip_welcome
@@ -91,8 +96,6 @@ def receive_help_welcome(client: Client, data: dict) -> bool:
     # Receive help welcome
     result = False
 
-    glovar.locks["message"].acquire()
-
     try:
         # Basic data
         user_id = data["user_id"]
@@ -101,39 +104,37 @@ def receive_help_welcome(client: Client, data: dict) -> bool:
 
         # Proceed
         for group_id in group_ids:
-            if group_id not in glovar.admin_ids:
-                continue
+            with get_group_lock(group_id):
+                if group_id not in glovar.admin_ids:
+                    continue
 
-            if not init_group_id(group_id):
-                continue
+                if not init_group_id(group_id):
+                    continue
 
-            glovar.member_ids[group_id].add(user_id)
-            save("member_ids")
+                add_member(group_id, user_id)
 
-            if not glovar.configs[group_id].get("welcome"):
-                continue
+                if not glovar.configs[group_id].get("welcome"):
+                    continue
 
-            if not glovar.configs[group_id].get("captcha"):
-                continue
+                if not glovar.configs[group_id].get("captcha"):
+                    continue
 
-            if user_id in glovar.welcomed_ids[group_id]:
-                continue
+                if is_welcomed(group_id, user_id):
+                    continue
 
-            member = get_member(client, group_id, user_id, False)
+                member = get_member(client, group_id, user_id, False)
 
-            if not member.user or member.status not in {"member", "restricted"}:
-                continue
+                if not member.user or member.status not in {"member", "restricted"}:
+                    continue
 
-            glovar.welcomes[group_id]["count"] += 1
-            glovar.welcomes[group_id]["today"] += 1
-            save("welcomes")
-            tip_welcome(client, member.user, group_id, message_id)
+                glovar.welcomes[group_id]["count"] += 1
+                glovar.welcomes[group_id]["today"] += 1
+                save("welcomes")
+                tip_welcome(client, member.user, group_id, message_id)
 
         result = True
     except Exception as e:
         logger.warning(f"Receive help welcome error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
@@ -157,24 +158,11 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
 
         # Clear user data
         elif data_type == "user":
-            if the_type == "all":
-                glovar.user_ids = {}
-
-            save("user_ids")
+            the_type == "all" and clear_users()
 
         # Clear watch data
         elif data_type == "watch":
-            if the_type == "all":
-                glovar.watch_ids = {
-                    "ban": {},
-                    "delete": {}
-                }
-            elif the_type == "ban":
-                glovar.watch_ids["ban"] = {}
-            elif the_type == "delete":
-                glovar.watch_ids["delete"] = {}
-
-            save("watch_ids")
+            clear_watches(the_type)
 
         # Clear white data
         elif (data_type == "white"
@@ -342,7 +330,7 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
             result = pickle.load(f)
 
         for f in {path, path_decrypted}:
-            thread(delete_file, (f,))
+            thread(delete_file, (f,), pool="persistence")
     except Exception as e:
         logger.warning(f"Receive file error: {e}", exc_info=True)
 
@@ -471,6 +459,10 @@ def receive_regex(client: Client, message: Message, data: str) -> bool:
 
         save(file_name)
 
+        # Compile the changed rules
+        compile_regex(word_type)
+        compile_regex_set()
+
         # Regenerate special characters dictionary if possible
         if file_name not in {"spc_words", "spe_words"}:
             return False
@@ -493,6 +485,8 @@ def receive_regex(client: Client, message: Message, data: str) -> bool:
             for k in keys:
                 eval(f"glovar.{special}_dict")[k] = value
 
+        init_special()
+
         result = True
     except Exception as e:
         logger.warning(f"Receive regex error: {e}", exc_info=True)
@@ -519,15 +513,8 @@ def receive_remove_bad(data: dict) -> bool:
 
         glovar.bad_ids["users"].discard(the_id)
         save("bad_ids")
-        glovar.watch_ids["ban"].pop(the_id, {})
-        glovar.watch_ids["delete"].pop(the_id, {})
-        save("watch_ids")
-
-        if not glovar.user_ids.get(the_id, {}):
-            return True
-
-        glovar.user_ids[the_id] = deepcopy(glovar.default_user_status)
-        save("user_ids")
+        remove_watch(the_id)
+        reset_user(the_id)
 
         result = True
     except Exception as e:
@@ -567,11 +554,7 @@ def receive_remove_score(data: int) -> bool:
         # Basic data
         uid = data
 
-        if not glovar.user_ids.get(uid, {}):
-            return True
-
-        glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-        save("user_ids")
+        reset_user(uid)
 
         result = True
     except Exception as e:
@@ -591,9 +574,7 @@ def receive_remove_watch(data: int) -> bool:
         uid = data
 
         # Reset watch status
-        glovar.watch_ids["ban"].pop(uid, 0)
-        glovar.watch_ids["delete"].pop(uid, 0)
-        save("watch_ids")
+        remove_watch(uid)
 
         result = True
     except Exception as e:
@@ -634,8 +615,22 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
         if the_data is None:
             return False
 
-        exec(f"glovar.{the_type} = the_data")
-        save(the_type)
+        # The stored data is imported into the database
+        if glovar.sqlite and the_type in glovar.store_files:
+            import_store(the_type, the_data)
+        else:
+            exec(f"glovar.{the_type} = the_data")
+            save(the_type)
+
+        # Compile the rolled back rules
+        if the_type.endswith("_words") and the_type.split("_")[0] in glovar.regex:
+            with glovar.locks["regex"]:
+                compile_regex(the_type.split("_")[0])
+                compile_regex_set()
+
+        # Rebuild the keyword indexes
+        if the_type == "keywords":
+            reset_keyword_index()
 
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
@@ -683,8 +678,7 @@ def receive_user_score(project: str, data: dict) -> bool:
             return False
 
         score = data["score"]
-        glovar.user_ids[uid]["score"][project] = score
-        save("user_ids")
+        set_score(uid, project, score)
 
         result = True
     except Exception as e:
@@ -710,15 +704,9 @@ def receive_watch_user(data: dict) -> bool:
         until = get_int(until)
 
         # Add to list
-        if the_type == "ban":
-            glovar.watch_ids["ban"][uid] = until
-        elif the_type == "delete":
-            glovar.watch_ids["delete"][uid] = until
-        else:
+        if not set_watch(the_type, uid, until):
             return False
 
-        save("watch_ids")
-
         result = True
     except Exception as e:
         logger.warning(f"Receive watch user error: {e}", exc_info=True)
@@ -0,0 +1,638 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import pickle
+import re
+import re2
+import sys
+from os import path, read
+from queue import Empty, Queue
+from select import select
+from struct import pack
+from subprocess import DEVNULL, PIPE, Popen
+from threading import BoundedSemaphore, Lock, Thread, current_thread, local
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from .. import glovar
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Python escapes to RE2, every replacement matches a superset of the original
+# Inside a negated class a superset narrows the class, so such rules are left to Python
+re2_escapes: Dict[str, Tuple[str, str]] = {
+    "d": (r"\p{N}", r"\p{N}"),
+    "w": (r"[\p{L}\p{N}\p{M}_]", r"\p{L}\p{N}\p{M}_"),
+    "s": (r"[\s\p{Z}\x{85}\x{1c}-\x{1f}\x{0b}]", r"\s\p{Z}\x{85}\x{1c}-\x{1f}\x{0b}"),
+    "D": (r"[\x00-\x{10FFFF}]", r"\x00-\x{10FFFF}"),
+    "W": (r"[\x00-\x{10FFFF}]", r"\x00-\x{10FFFF}"),
+    "S": (r"[\x00-\x{10FFFF}]", r"\x00-\x{10FFFF}"),
+    "b": ("", r"\x08"),
+    "B": ("", r"\x{10FFFF}"),
+    "Z": (r"\z", r"\x{10FFFF}")
+}
+
+# Dotted and dotless i, which Python folds with i and I in the ignorecase mode but RE2 does not,
+# RE2 reads them as i in the texts, and the rules which include them are left to Python
+re2_folds: Dict[int, str] = {0x130: "i", 0x131: "i"}
+
+# Characters of a rule with the ranges they begin, escaped code points included
+re2_chars = re.compile(r"(\\u[0-9a-fA-F]{4}|\\U[0-9a-fA-F]{8}|\\x[0-9a-fA-F]{2}|\\?.)"
+                       r"(?:-(\\u[0-9a-fA-F]{4}|\\U[0-9a-fA-F]{8}|\\x[0-9a-fA-F]{2}|\\?.))?", re.S)
+
+# Rules which may cause catastrophic backtracking
+suspect_patterns: List[Pattern] = [
+    re.compile(r"\\[1-9]|\(\?P="),
+    re.compile(r"\((?:[^()\\]|\\.)*[*+}](?:[^()\\]|\\.)*\)[*+{]"),
+    re.compile(r"\((?:[^()\\]|\\.)*\|(?:[^()\\]|\\.)*\)[*+{]")
+]
+
+# Decay of the hit scores at every flush of the counters
+score_decay: float = 0.99
+
+# Recently scanned texts of the current thread
+scanned = local()
+
+# Hit counters, every thread only writes its own counter
+counters = local()
+counters_all: List[Tuple[Thread, Dict[Tuple[str, str], int], Dict[Tuple[str, str], int]]] = []
+counters_lock = Lock()
+
+# Idle guarded regex workers, started from the program's root directory
+workers: Queue = Queue()
+workers_cwd: str = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+workers_limit = BoundedSemaphore(4)
+
+
+def add_suspect(word: str) -> bool:
+    # Let the rule be checked by the guarded workers
+    result = False
+
+    try:
+        if word in glovar.suspect_words:
+            return True
+
+        try:
+            re2_word = get_re2_word(word)
+            prefilter = re2_word and re2.compile(re2_word) or None
+        except Exception as e:
+            logger.info(f"Compile prefilter {word} error: {e}")
+            prefilter = None
+
+        glovar.suspect_words[word] = prefilter
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Add suspect error: {e}", exc_info=True)
+
+    return result
+
+
+def ask_guard(worker: Popen, words: List[str], text: str) -> bytes:
+    # Send the rules to the guarded worker, get one answer for every rule which finished in time
+    result = b""
+
+    try:
+        data = pickle.dumps((words, text))
+        worker.stdin.write(pack(">I", len(data)) + data)
+        worker.stdin.flush()
+
+        fd = worker.stdout.fileno()
+
+        while len(result) < len(words) and not result.endswith(b"1"):
+            if not select([fd], [], [], glovar.time_regex)[0]:
+                break
+
+            answer = read(fd, 1)
+
+            if not answer:
+                raise EOFError("guard exited")
+
+            result += answer
+    except Exception:
+        worker.kill()
+        worker.wait()
+        raise
+
+    return result
+
+
+def check_regex_time(word: str, spent: float) -> bool:
+    # Check the time spent by the rule in the current process
+    result = False
+
+    if spent >= glovar.time_regex:
+        raise TimeoutError(word)
+
+    try:
+        if not glovar.guard or spent < 0.1:
+            return False
+
+        result = add_suspect(word)
+    except Exception as e:
+        logger.warning(f"Check regex time error: {e}", exc_info=True)
+
+    return result
+
+
+def count_regex(word_type: str, word: str) -> bool:
+    # Count a hit of the rule in the current thread's counter
+    result = False
+
+    try:
+        counter = getattr(counters, "counter", None)
+
+        if counter is None:
+            counter = counters.counter = {}
+
+            with counters_lock:
+                counters_all.append((current_thread(), counter, {}))
+
+        key = (word_type, word)
+        counter[key] = counter.get(key, 0) + 1
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Count regex error: {e}", exc_info=True)
+
+    return result
+
+
+def compile_regex(word_type: str, words: Iterable[str] = None) -> bool:
+    # Compile the regex rules of the word type, should be called with the regex lock
+    result = False
+
+    try:
+        if words is None:
+            words = list(eval(f"glovar.{word_type}_words"))
+        else:
+            words = list(words)
+
+        if glovar.compiled.get(word_type) is None:
+            glovar.compiled[word_type] = {}
+
+        compiled = glovar.compiled[word_type]
+        word_set = set(words)
+
+        # Drop the removed rules
+        for word in [w for w in compiled if w not in word_set]:
+            compiled.pop(word, None)
+            glovar.suspect_words.pop(word, None)
+            glovar.regex_scores.get(word_type, {}).pop(word, None)
+
+        # Compile the new rules
+        for word in words:
+            if word in compiled:
+                continue
+
+            compiled[word] = get_pattern(word)
+
+            if glovar.guard and compiled[word] and is_suspect_word(word):
+                add_suspect(word)
+
+        # Put the hot rules first
+        if glovar.adaptive:
+            sort_regex(word_type)
+
+        # Update the version
+        glovar.regex_versions[word_type] = glovar.regex_versions.get(word_type, 0) + 1
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Compile regex {word_type} error: {e}", exc_info=True)
+
+    return result
+
+
+def compile_regex_set() -> bool:
+    # Compile all the RE2 compatible rules into one set, should be called with the regex lock
+    result = False
+
+    try:
+        if not glovar.multi:
+            return False
+
+        options = re2.Options()
+        options.max_mem = 256 << 20
+        regex_set = re2.Set.SearchSet(options)
+        index: List[Tuple[str, str]] = []
+        fallback: Dict[str, Set[str]] = {}
+
+        for word_type in glovar.regex:
+            fallback[word_type] = set()
+
+            for word, pattern in glovar.compiled.get(word_type, {}).items():
+                if not pattern:
+                    continue
+
+                re2_word = get_re2_word(word)
+
+                if not re2_word:
+                    fallback[word_type].add(word)
+                    continue
+
+                try:
+                    regex_set.Add(re2_word)
+                    index.append((word_type, word))
+                except Exception as e:
+                    logger.info(f"Add {word} to the regex set error: {e}")
+                    fallback[word_type].add(word)
+
+        regex_set.Compile()
+
+        glovar.matcher = {
+            "set": regex_set,
+            "index": index,
+            "fallback": fallback
+        }
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Compile regex set error: {e}", exc_info=True)
+        glovar.matcher = {}
+
+    return result
+
+
+def get_guard() -> Optional[Popen]:
+    # Get an idle guarded regex worker
+    result = None
+
+    try:
+        result = workers.get_nowait()
+    except Empty:
+        result = Popen([sys.executable, "-m", "plugins.guard"],
+                       cwd=workers_cwd, stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+    except Exception as e:
+        logger.error(f"Get guard error: {e}", exc_info=True)
+
+    return result
+
+
+def get_candidates(matcher: dict, word_type: str, text: str,
+                   patterns: List[Tuple[str, Optional[Pattern]]]) -> List[Tuple[str, Optional[Pattern]]]:
+    # Get the patterns that may hit the text
+    result = patterns
+
+    try:
+        hits = get_regex_hits(matcher, text)
+
+        if hits is None:
+            return patterns
+
+        words = hits.get(word_type, set()) | matcher["fallback"].get(word_type, set())
+
+        if not words:
+            return []
+
+        result = [(word, pattern) for word, pattern in patterns if word in words]
+    except Exception as e:
+        logger.warning(f"Get candidates error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_count() -> Dict[str, Dict[str, int]]:
+    # Get the hits counted since the last call
+    result = {}
+
+    counters_lock.acquire()
+
+    try:
+        for thread, counter, seen in list(counters_all):
+            for key, count in list(counter.items()):
+                delta = count - seen.get(key, 0)
+
+                if not delta:
+                    continue
+
+                seen[key] = count
+                word_type, word = key
+
+                if result.get(word_type) is None:
+                    result[word_type] = {}
+
+                result[word_type][word] = result[word_type].get(word, 0) + delta
+
+        # Drop the counters of the finished threads
+        counters_all[:] = [c for c in counters_all if c[0].is_alive()]
+    except Exception as e:
+        logger.warning(f"Get regex count error: {e}", exc_info=True)
+    finally:
+        counters_lock.release()
+
+    return result
+
+
+def get_regex_version() -> int:
+    # Get the version of all the rules, it changes whenever any word type is compiled
+    result = 0
+
+    try:
+        with glovar.locks["regex"]:
+            result = sum(glovar.regex_versions.values())
+    except Exception as e:
+        logger.warning(f"Get regex version error: {e}", exc_info=True)
+
+    return result
+
+
+def get_pattern(word: str) -> Optional[Pattern]:
+    # Get a compiled pattern of the regex rule
+    result = None
+
+    try:
+        result = re.compile(word, re.I | re.S | re.M)
+    except Exception as e:
+        logger.warning(f"Get pattern {word} error: {e}", exc_info=True)
+
+    return result
+
+
+def get_patterns(word_type: str) -> List[Tuple[str, Optional[Pattern]]]:
+    # Get the compiled patterns of the word type, should be called with the regex lock
+    result = []
+
+    try:
+        result = list(glovar.compiled.get(word_type, {}).items())
+    except Exception as e:
+        logger.warning(f"Get patterns {word_type} error: {e}", exc_info=True)
+
+    return result
+
+
+def get_re2_word(word: str) -> str:
+    # Get a RE2 pattern which matches a superset of the Python regex rule, or an empty string if there is none
+    result = ""
+
+    try:
+        if is_fold_word(word):
+            return ""
+
+        i = 0
+        length = len(word)
+        begin = -1
+        negated = False
+
+        while i < length:
+            c = word[i]
+
+            # Escape
+            if c == "\\" and i + 1 < length:
+                e = word[i + 1]
+
+                if e in {"u", "U"}:
+                    size = 4 if e == "u" else 8
+                    result += f"\\x{{{word[i + 2:i + 2 + size]}}}"
+                    i += 2 + size
+                elif negated and e in "dwsDWS":
+                    return ""
+                elif e in re2_escapes:
+                    result += re2_escapes[e][int(begin >= 0)]
+                    i += 2
+                else:
+                    result += word[i:i + 2]
+                    i += 2
+
+                continue
+
+            # Character class
+            if begin < 0 and c == "[":
+                begin = i
+                result += c
+                i += 1
+
+                negated = i < length and word[i] == "^"
+
+                if negated:
+                    result += "^"
+                    i += 1
+
+                if i < length and word[i] == "]":
+                    result += "\\]"
+                    i += 1
+
+                continue
+            elif begin >= 0 and c == "]":
+                begin = -1
+                negated = False
+
+            # RE2 reads a quantifier without the minimum as literal text
+            if begin < 0 and word.startswith("{,", i):
+                return ""
+
+            # Comment
+            if begin < 0 and word.startswith("(?#", i):
+                end = word.find(")", i)
+                i = length if end < 0 else end + 1
+                continue
+
+            result += c
+            i += 1
+
+        result = f"(?ims){result}"
+    except Exception as e:
+        logger.warning(f"Get re2 word error: {e}", exc_info=True)
+        result = ""
+
+    return result
+
+
+def get_re2_text(text: str) -> str:
+    # Get the text scanned by RE2, with the dotted and dotless i read as i
+    result = text
+
+    try:
+        if "\u0130" in text or "\u0131" in text:
+            result = text.translate(re2_folds)
+    except Exception as e:
+        logger.warning(f"Get re2 text error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_hits(matcher: dict, text: str) -> Optional[Dict[str, Set[str]]]:
+    # Get the rules of all word types that may hit the text in one scan
+    result = None
+
+    try:
+        if not matcher or not text:
+            return None
+
+        # Check the scanned texts
+        if getattr(scanned, "matcher", None) is not matcher or len(scanned.hits) > 16:
+            scanned.matcher = matcher
+            scanned.hits = {}
+
+        if text in scanned.hits:
+            return scanned.hits[text]
+
+        # Scan the text
+        result = {}
+
+        for i in matcher["set"].Match(get_re2_text(text)) or []:
+            word_type, word = matcher["index"][i]
+
+            if result.get(word_type) is None:
+                result[word_type] = set()
+
+            result[word_type].add(word)
+
+        scanned.hits[text] = result
+    except Exception as e:
+        logger.warning(f"Get regex hits error: {e}", exc_info=True)
+
+    return result
+
+
+def is_fold_word(word: str) -> bool:
+    # Check if the rule includes the dotted or dotless i, or a range of them, which RE2 does not fold with i
+    result = False
+
+    try:
+        for match in re2_chars.finditer(word):
+            begin, end = (int(c[2:], 16) if len(c) > 2 else ord(c[-1]) for c in (match[1], match[2] or match[1]))
+
+            if any(begin <= code <= end for code in re2_folds):
+                return True
+    except Exception as e:
+        logger.warning(f"Is fold word error: {e}", exc_info=True)
+
+    return result
+
+
+def is_suspect_word(word: str) -> bool:
+    # Check if the rule may cause catastrophic backtracking
+    result = False
+
+    try:
+        result = any(p.search(word) for p in suspect_patterns)
+    except Exception as e:
+        logger.warning(f"Is suspect word error: {e}", exc_info=True)
+
+    return result
+
+
+def init_regex() -> bool:
+    # Compile all the regex rules
+    result = False
+
+    glovar.locks["regex"].acquire()
+
+    try:
+        if glovar.adaptive:
+            score_regex(glovar.regex_counts)
+
+        for word_type in glovar.regex:
+            compile_regex(word_type)
+
+        compile_regex_set()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init regex error: {e}", exc_info=True)
+    finally:
+        glovar.locks["regex"].release()
+
+    return result
+
+
+def score_regex(counts: Dict[str, Dict[str, int]]) -> bool:
+    # Decay the hit scores and add the new hits, should be called with the regex lock
+    result = False
+
+    try:
+        for word_type in set(glovar.regex_scores) | set(counts):
+            scores = glovar.regex_scores.get(word_type, {})
+            scores = {w: s * score_decay for w, s in scores.items() if s * score_decay >= 0.01}
+
+            for word, count in counts.get(word_type, {}).items():
+                scores[word] = scores.get(word, 0) + count
+
+            glovar.regex_scores[word_type] = scores
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Score regex error: {e}", exc_info=True)
+
+    return result
+
+
+def search_guarded(words: List[str], text: str) -> Tuple[str, List[str], List[str]]:
+    # Check the suspect rules in a worker process which is killed when a rule runs out of time,
+    # return the rule which hit the text, the rules which ran out of time,
+    # and the rules which the workers failed to check, they should be checked in the current process
+    hit = ""
+    timeouts = []
+
+    # Check the prefilters
+    re2_text = get_re2_text(text)
+    words = [w for w in words if not glovar.suspect_words.get(w) or glovar.suspect_words[w].search(re2_text)]
+
+    workers_limit.acquire()
+
+    try:
+        while words:
+            worker = get_guard()
+
+            if not worker:
+                break
+
+            answers = ask_guard(worker, words, text)
+
+            if answers.endswith(b"1"):
+                hit = words[len(answers) - 1]
+
+            if hit or len(answers) == len(words):
+                workers.put(worker)
+                words = []
+                break
+
+            # Kill the worker, then check the rest rules with a new one
+            worker.kill()
+            worker.wait()
+            timeouts.append(words[len(answers)])
+            words = words[len(answers) + 1:]
+    except Exception as e:
+        logger.error(f"Search guarded error: {e}", exc_info=True)
+    finally:
+        workers_limit.release()
+
+    return hit, timeouts, words
+
+
+def sort_regex(word_type: str) -> bool:
+    # Sort the compiled rules by the hit scores, then by the length, should be called with the regex lock
+    result = False
+
+    try:
+        compiled = glovar.compiled.get(word_type)
+
+        if not compiled:
+            return False
+
+        scores = glovar.regex_scores.get(word_type, {})
+        words = sorted(compiled, key=lambda w: (-scores.get(w, 0), len(w)))
+        glovar.compiled[word_type] = {w: compiled[w] for w in words}
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Sort regex {word_type} error: {e}", exc_info=True)
+
+    return result
@@ -0,0 +1,506 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+import sqlite3
+from copy import deepcopy
+from typing import Any, Dict, Iterable, List
+
+from .. import glovar
+from .cache import Cache
+from .file import journal, save
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Hot cache in front of the database
+hot = Cache(65536)
+
+# Tables of the database
+tables = [
+    "CREATE TABLE IF NOT EXISTS members (gid INTEGER NOT NULL, uid INTEGER NOT NULL, "
+    "PRIMARY KEY (gid, uid)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS welcomed (gid INTEGER NOT NULL, uid INTEGER NOT NULL, "
+    "PRIMARY KEY (gid, uid)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS watches (type TEXT NOT NULL, uid INTEGER NOT NULL, until INTEGER NOT NULL, "
+    "PRIMARY KEY (type, uid)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS users (uid INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS scores (uid INTEGER NOT NULL, project TEXT NOT NULL, score REAL NOT NULL, "
+    "PRIMARY KEY (uid, project)) WITHOUT ROWID"
+]
+
+
+def add_member(gid: int, uid: int) -> bool:
+    # Add a member of the group
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            return journal("member_ids", "add", (gid,), uid)
+
+        execute("INSERT OR IGNORE INTO members (gid, uid) VALUES (?, ?)", (gid, uid))
+        hot.set(("member", gid, uid), True)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Add member error: {e}", exc_info=True)
+
+    return result
+
+
+def add_welcomed(gid: int, uid: int) -> bool:
+    # Add a welcomed user of the group
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            glovar.welcomed_ids[gid].add(uid)
+            return True
+
+        execute("INSERT OR IGNORE INTO welcomed (gid, uid) VALUES (?, ?)", (gid, uid))
+        hot.set(("welcomed", gid, uid), True)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Add welcomed error: {e}", exc_info=True)
+
+    return result
+
+
+def clear_group(gid: int) -> bool:
+    # Clear the members and the welcomed users of the group
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            journal("member_ids", "pop", (gid,))
+            glovar.welcomed_ids.pop(gid, set())
+            return True
+
+        execute("DELETE FROM members WHERE gid = ?", (gid,))
+        execute("DELETE FROM welcomed WHERE gid = ?", (gid,))
+        hot.clear()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Clear group error: {e}", exc_info=True)
+
+    return result
+
+
+def clear_users() -> bool:
+    # Clear the data of all users
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            glovar.user_ids = {}
+            return save("user_ids")
+
+        execute("DELETE FROM scores")
+        execute("DELETE FROM users")
+        hot.clear()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Clear users error: {e}", exc_info=True)
+
+    return result
+
+
+def clear_watches(the_type: str) -> bool:
+    # Clear the watch users of the type, or of all types
+    result = False
+
+    try:
+        if the_type not in {"all", "ban", "delete"}:
+            return False
+
+        if not glovar.sqlite and the_type == "all":
+            glovar.watch_ids = {
+                "ban": {},
+                "delete": {}
+            }
+            return save("watch_ids")
+        elif not glovar.sqlite:
+            glovar.watch_ids[the_type] = {}
+            return save("watch_ids")
+
+        if the_type == "all":
+            execute("DELETE FROM watches")
+        else:
+            execute("DELETE FROM watches WHERE type = ?", (the_type,))
+
+        hot.clear()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Clear watches error: {e}", exc_info=True)
+
+    return result
+
+
+def execute(sql: str, params: Iterable = (), many: bool = False) -> List[tuple]:
+    # Execute a statement in a transaction, the statements are prepared and cached by the connection, raise on errors
+    result = []
+
+    with glovar.locks["store"]:
+        with glovar.database:
+            if many:
+                glovar.database.executemany(sql, params)
+            else:
+                result = glovar.database.execute(sql, params).fetchall()
+
+    return result
+
+
+def export_store(file: str) -> Any:
+    # Export the stored data in the format of the global variable, None if the data is not in the database
+    result = None
+
+    try:
+        if not glovar.sqlite or file not in glovar.store_files:
+            return None
+
+        if file == "member_ids":
+            result = {}
+
+            for gid, uid in execute("SELECT gid, uid FROM members"):
+                result.setdefault(gid, set()).add(uid)
+        elif file == "user_ids":
+            result = {uid: deepcopy(glovar.default_user_status) for uid, in execute("SELECT uid FROM users")}
+
+            for uid, project, score in execute("SELECT uid, project, score FROM scores"):
+                uid in result and result[uid]["score"].update({project: score})
+        elif file == "watch_ids":
+            result = {
+                "ban": {},
+                "delete": {}
+            }
+
+            for the_type, uid, until in execute("SELECT type, uid, until FROM watches"):
+                result.setdefault(the_type, {})[uid] = until
+    except Exception as e:
+        logger.warning(f"Export store {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def get_user_status(uid: int) -> Dict[str, Dict[str, float]]:
+    # Get the status of the user, empty if the user is unknown
+    result = {}
+
+    try:
+        if not glovar.sqlite:
+            return glovar.user_ids.get(uid, {})
+
+        result = hot.get(("user", uid))
+
+        if result is not None:
+            return result
+
+        if execute("SELECT 1 FROM users WHERE uid = ?", (uid,)):
+            result = deepcopy(glovar.default_user_status)
+            result["score"].update(execute("SELECT project, score FROM scores WHERE uid = ?", (uid,)))
+        else:
+            result = {}
+
+        hot.set(("user", uid), result)
+    except Exception as e:
+        logger.warning(f"Get user status error: {e}", exc_info=True)
+
+    return result
+
+
+def get_watch(the_type: str, uid: int) -> int:
+    # Get the watch time of the user
+    result = 0
+
+    try:
+        if not glovar.sqlite:
+            return glovar.watch_ids[the_type].get(uid, 0)
+
+        result = hot.get(("watch", the_type, uid))
+
+        if result is not None:
+            return result
+
+        rows = execute("SELECT until FROM watches WHERE type = ? AND uid = ?", (the_type, uid))
+        result = hot.set(("watch", the_type, uid), rows[0][0] if rows else 0)
+    except Exception as e:
+        logger.warning(f"Get watch error: {e}", exc_info=True)
+
+    return result
+
+
+def import_store(file: str, data: Any) -> bool:
+    # Replace the stored data with the data in the format of the global variable
+    result = False
+
+    try:
+        if not glovar.sqlite or file not in glovar.store_files:
+            return False
+
+        with glovar.locks["store"]:
+            with glovar.database:
+                if file == "member_ids":
+                    glovar.database.execute("DELETE FROM members")
+                    glovar.database.executemany("INSERT OR IGNORE INTO members (gid, uid) VALUES (?, ?)",
+                                                ((gid, uid) for gid in data for uid in data[gid]))
+                elif file == "user_ids":
+                    glovar.database.execute("DELETE FROM scores")
+                    glovar.database.execute("DELETE FROM users")
+                    glovar.database.executemany("INSERT OR IGNORE INTO users (uid) VALUES (?)",
+                                                ((uid,) for uid in data))
+                    glovar.database.executemany("INSERT OR REPLACE INTO scores (uid, project, score) VALUES (?, ?, ?)",
+                                                ((uid, project, score) for uid in data
+                                                 for project, score in data[uid].get("score", {}).items() if score))
+                elif file == "watch_ids":
+                    glovar.database.execute("DELETE FROM watches")
+                    glovar.database.executemany("INSERT OR IGNORE INTO watches (type, uid, until) VALUES (?, ?, ?)",
+                                                ((the_type, uid, until) for the_type in data
+                                                 for uid, until in data[the_type].items()))
+
+        hot.clear()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Import store {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def init_store() -> bool:
+    # Open the database, move the data from the pickle files if the database is new
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            return True
+
+        glovar.database = sqlite3.connect(glovar.SQLITE_PATH, check_same_thread=False, cached_statements=64)
+        glovar.database.execute("PRAGMA journal_mode = WAL")
+        glovar.database.execute("PRAGMA synchronous = NORMAL")
+
+        for table in tables:
+            execute(table)
+
+        # Welcomed users are runtime data
+        execute("DELETE FROM welcomed")
+
+        if execute("SELECT 1 FROM users LIMIT 1") or execute("SELECT 1 FROM members LIMIT 1"):
+            return True
+
+        # Move the data
+        execute("INSERT OR IGNORE INTO members (gid, uid) VALUES (?, ?)",
+                ((gid, uid) for gid in glovar.member_ids for uid in glovar.member_ids[gid]), True)
+        execute("INSERT OR IGNORE INTO watches (type, uid, until) VALUES (?, ?, ?)",
+                ((the_type, uid, until) for the_type in glovar.watch_ids
+                 for uid, until in glovar.watch_ids[the_type].items()), True)
+        execute("INSERT OR IGNORE INTO users (uid) VALUES (?)", ((uid,) for uid in glovar.user_ids), True)
+        execute("INSERT OR REPLACE INTO scores (uid, project, score) VALUES (?, ?, ?)",
+                ((uid, project, score) for uid in glovar.user_ids
+                 for project, score in glovar.user_ids[uid].get("score", {}).items() if score), True)
+
+        # Free the memory
+        glovar.member_ids = {}
+        save("member_ids")
+        glovar.user_ids = {}
+        save("user_ids")
+        glovar.watch_ids = {
+            "ban": {},
+            "delete": {}
+        }
+        save("watch_ids")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init store error: {e}", exc_info=True)
+
+    return result
+
+
+def init_user(uid: int) -> bool:
+    # Init the data of the user
+    result = False
+
+    try:
+        if not glovar.sqlite and glovar.user_ids.get(uid) is not None:
+            return True
+        elif not glovar.sqlite:
+            return journal("user_ids", "set", (uid,), deepcopy(glovar.default_user_status))
+
+        if hot.get(("user", uid)):
+            return True
+
+        execute("INSERT OR IGNORE INTO users (uid) VALUES (?)", (uid,))
+        hot.pop(("user", uid))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init user error: {e}", exc_info=True)
+
+    return result
+
+
+def is_member(gid: int, uid: int) -> bool:
+    # Check if the user is a known member of the group
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            return uid in glovar.member_ids.get(gid, set())
+
+        result = hot.get(("member", gid, uid))
+
+        if result is not None:
+            return result
+
+        rows = execute("SELECT 1 FROM members WHERE gid = ? AND uid = ?", (gid, uid))
+        result = hot.set(("member", gid, uid), bool(rows))
+    except Exception as e:
+        logger.warning(f"Is member error: {e}", exc_info=True)
+
+    return result
+
+
+def is_welcomed(gid: int, uid: int) -> bool:
+    # Check if the user has been welcomed in the group
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            return uid in glovar.welcomed_ids[gid]
+
+        result = hot.get(("welcomed", gid, uid))
+
+        if result is not None:
+            return result
+
+        rows = execute("SELECT 1 FROM welcomed WHERE gid = ? AND uid = ?", (gid, uid))
+        result = hot.set(("welcomed", gid, uid), bool(rows))
+    except Exception as e:
+        logger.warning(f"Is welcomed error: {e}", exc_info=True)
+
+    return result
+
+
+def remove_watch(uid: int) -> bool:
+    # Remove the user from all watch lists
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            journal("watch_ids", "pop", ("ban", uid))
+            journal("watch_ids", "pop", ("delete", uid))
+            return True
+
+        execute("DELETE FROM watches WHERE uid = ?", (uid,))
+
+        for the_type in ["ban", "delete"]:
+            hot.pop(("watch", the_type, uid))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Remove watch error: {e}", exc_info=True)
+
+    return result
+
+
+def reset_user(uid: int) -> bool:
+    # Reset the scores of a known user
+    result = False
+
+    try:
+        if not get_user_status(uid):
+            return True
+
+        if not glovar.sqlite:
+            return journal("user_ids", "set", (uid,), deepcopy(glovar.default_user_status))
+
+        execute("DELETE FROM scores WHERE uid = ?", (uid,))
+        hot.pop(("user", uid))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Reset user error: {e}", exc_info=True)
+
+    return result
+
+
+def set_members(gid: int, uids: Iterable[int]) -> bool:
+    # Replace the members of the group
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            return journal("member_ids", "set", (gid,), set(uids))
+
+        with glovar.locks["store"]:
+            with glovar.database:
+                glovar.database.execute("DELETE FROM members WHERE gid = ?", (gid,))
+                glovar.database.executemany("INSERT OR IGNORE INTO members (gid, uid) VALUES (?, ?)",
+                                            ((gid, uid) for uid in uids))
+
+        hot.clear()
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Set members error: {e}", exc_info=True)
+
+    return result
+
+
+def set_score(uid: int, project: str, score: float) -> bool:
+    # Set the score of the user given by the project
+    result = False
+
+    try:
+        if not glovar.sqlite:
+            return journal("user_ids", "set", (uid, "score", project), score)
+
+        execute("INSERT OR REPLACE INTO scores (uid, project, score) VALUES (?, ?, ?)", (uid, project, score))
+        hot.pop(("user", uid))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Set score error: {e}", exc_info=True)
+
+    return result
+
+
+def set_watch(the_type: str, uid: int, until: int) -> bool:
+    # Set the watch time of the user
+    result = False
+
+    try:
+        if the_type not in {"ban", "delete"}:
+            return False
+
+        if not glovar.sqlite:
+            return journal("watch_ids", "set", (the_type, uid), until)
+
+        execute("INSERT OR REPLACE INTO watches (type, uid, until) VALUES (?, ?, ?)", (the_type, uid, until))
+        hot.set(("watch", the_type, uid), until)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Set watch error: {e}", exc_info=True)
+
+    return result
@@ -29,8 +29,10 @@ from pyrogram.raw.types import UserFull
 from pyrogram.types import (Chat, ChatMember, ChatPermissions, ChatPreview, InlineKeyboardMarkup, Message,
                             ReplyKeyboardMarkup, User)
 
+from .actions import defer_action
 from .decorators import threaded, retry
 from .etc import delay, wait_flood
+from .limiter import pause_chat, wait_token
 from .. import glovar
 
 # Enable logging
@@ -172,6 +174,7 @@ def forward_messages(client: Client, cid: int, fid: int, mids: Union[int, Iterab
     result = None
 
     try:
+        wait_token(cid)
         result = client.forward_messages(
             chat_id=cid,
             from_chat_id=fid,
@@ -181,6 +184,7 @@ def forward_messages(client: Client, cid: int, fid: int, mids: Union[int, Iterab
         )
     except FloodWait as e:
         logger.warning(f"Forward message from {fid} to {cid} - Sleep for {e.x} second(s)")
+        pause_chat(cid, e.x)
         raise e
     except (ChannelInvalid, ChannelPrivate, ChatAdminRequired, MessageIdInvalid, PeerIdInvalid):
         return False
@@ -391,6 +395,9 @@ def kick_chat_member(client: Client, cid: int, uid: Union[int, str],
         else:
             new_date = 0
 
+        if defer_action(e.x):
+            return None
+
         wait_flood(e)
 
         return kick_chat_member(client, cid, uid, new_date)
@@ -426,6 +433,7 @@ def pin_chat_message(client: Client, cid: int, mid: int) -> Optional[bool]:
     result = None
 
     try:
+        wait_token(cid)
         result = client.pin_chat_message(
             chat_id=cid,
             message_id=mid,
@@ -433,6 +441,7 @@ def pin_chat_message(client: Client, cid: int, mid: int) -> Optional[bool]:
         )
     except FloodWait as e:
         logger.warning(f"Pin chat message {mid} in {cid} - Sleep for {e.x} second(s)")
+        pause_chat(cid, e.x)
         raise e
     except (ChannelInvalid, ChannelPrivate, ChatAdminRequired, ChatNotModified, PeerIdInvalid):
         return False
@@ -481,6 +490,9 @@ def restrict_chat_member(client: Client, cid: int, uid: int, permissions: ChatPe
         else:
             new_date = 0
 
+        if defer_action(e.x):
+            return None
+
         wait_flood(e)
 
         return restrict_chat_member(client, cid, uid, permissions, new_date)
@@ -497,6 +509,7 @@ def send_document(client: Client, cid: int, document: str, file_ref: str = None,
     result = None
 
     try:
+        wait_token(cid)
         result = client.send_document(
             chat_id=cid,
             document=document,
@@ -508,6 +521,7 @@ def send_document(client: Client, cid: int, document: str, file_ref: str = None,
         )
     except FloodWait as e:
         logger.warning(f"Send document {document} to {cid} - Sleep for {e.x} second(s)")
+        pause_chat(cid, e.x)
         raise e
     except (ButtonDataInvalid, ButtonUrlInvalid):
         logger.warning(f"Send document {document} to {cid} - invalid markup: {markup}")
@@ -529,6 +543,7 @@ def send_message(client: Client, cid: int, text: str, mid: int = None,
         if not text.strip():
             return None
 
+        wait_token(cid)
         result = client.send_message(
             chat_id=cid,
             text=text,
@@ -539,6 +554,7 @@ def send_message(client: Client, cid: int, text: str, mid: int = None,
         )
     except FloodWait as e:
         logger.warning(f"Send message to {cid} - Sleep for {e.x} second(s)")
+        pause_chat(cid, e.x)
         raise e
     except (ButtonDataInvalid, ButtonUrlInvalid):
         logger.warning(f"Send message to {cid} - invalid markup: {markup}")
@@ -560,6 +576,7 @@ def send_photo(client: Client, cid: int, photo: str, file_ref: str = None, capti
         if not photo.strip():
             return None
 
+        wait_token(cid)
         result = client.send_photo(
             chat_id=cid,
             photo=photo,
@@ -571,6 +588,7 @@ def send_photo(client: Client, cid: int, photo: str, file_ref: str = None, capti
         )
     except FloodWait as e:
         logger.warning(f"Send photo {photo} to {cid} - Sleep for {e.x} second(s)")
+        pause_chat(cid, e.x)
         raise e
     except (ButtonDataInvalid, ButtonUrlInvalid):
         logger.warning(f"Send photo {photo} to {cid} - invalid markup: {markup}")
@@ -631,6 +649,7 @@ def unpin_chat_message(client: Client, cid: int, mid: int) -> Optional[bool]:
     result = None
 
     try:
+        wait_token(cid)
         # result = client.unpin_chat_message(
         #     chat_id=cid,
         #     message_id=mid
@@ -640,6 +659,7 @@ def unpin_chat_message(client: Client, cid: int, mid: int) -> Optional[bool]:
         )
     except FloodWait as e:
         logger.warning(f"Unpin chat message {mid} in {cid} - Sleep for {e.x} second(s)")
+        pause_chat(cid, e.x)
         raise e
     except (ChannelInvalid, ChannelPrivate, ChatAdminRequired, ChatNotModified, PeerIdInvalid):
         return False
@@ -27,8 +27,11 @@ from .. import glovar
 from .channel import share_data, share_regex_count
 from .decorators import threaded
 from .etc import bold, code, general_link, get_now, get_readable_time, lang, thread
-from .file import data_to_file, move_file, save
+from .file import copy_data, data_to_file, journal, move_file, save
 from .group import delete_message, get_pinned, leave_group, save_admins
+from .locks import get_group_lock
+from .regex import get_regex_count, score_regex, sort_regex
+from .store import clear_users, clear_watches, export_store, set_members
 from .telegram import get_admins, get_chat_member, get_group_info, get_members, get_messages, send_message
 from .tip import get_invite_link
 
@@ -36,15 +39,19 @@ from .tip import get_invite_link
 logger = logging.getLogger(__name__)
 
 
-@threaded()
+@threaded(pool="persistence")
 def backup_files(client: Client) -> bool:
     # Backup data files to BACKUP
     result = False
 
     try:
         for file in glovar.file_list:
+            # Get the data, the stored data is exported from the database
+            data = export_store(file)
+            data = copy_data(file) if data is None else data
+
             # Check
-            if not eval(f"glovar.{file}"):
+            if not data:
                 continue
 
             # Share
@@ -54,7 +61,7 @@ def backup_files(client: Client) -> bool:
                 action="backup",
                 action_type="data",
                 data=file,
-                file=f"{glovar.PICKLE_PATH}/{file}"
+                file=data_to_file(data)
             )
             sleep(5)
 
@@ -65,54 +72,96 @@ def backup_files(client: Client) -> bool:
     return result
 
 
+def flush_count() -> bool:
+    # Flush the regex hit counters
+    result = False
+
+    glovar.locks["regex"].acquire()
+
+    try:
+        counts = get_regex_count()
+
+        if not counts:
+            return False
+
+        for word_type in counts:
+            if glovar.regex_counts.get(word_type) is None:
+                glovar.regex_counts[word_type] = {}
+
+            for word, count in counts[word_type].items():
+                glovar.regex_counts[word_type][word] = glovar.regex_counts[word_type].get(word, 0) + count
+
+        save("regex_counts")
+
+        # Reorder the rules which have new hits
+        if glovar.adaptive:
+            score_regex(counts)
+
+            for word_type in counts:
+                sort_regex(word_type)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Flush count error: {e}", exc_info=True)
+    finally:
+        glovar.locks["regex"].release()
+
+    return result
+
+
 def interval_min_01(client: Client) -> bool:
     # Execute every minute
     result = True
 
-    glovar.locks["message"].acquire()
-
     try:
         # Basic data
         now = get_now()
 
         # Delete tips
         for gid in list(glovar.message_ids):
-            # Check clean mode config
-            if not glovar.configs[gid].get("clean", True):
-                continue
-
-            # Destruct keywords messages
-            for key in list(glovar.message_ids[gid]["keywords"]):
-                mid, time = glovar.message_ids[gid]["keywords"][key]
-                keyword = glovar.keywords[gid]["kws"].get(key, {})
+            with get_group_lock(gid):
+                # Check the group
+                if gid not in glovar.message_ids:
+                    continue
 
-                if not keyword:
-                    glovar.message_ids[gid]["keywords"].pop(key, (0, 0))
-                    delete_message(client, gid, mid)
+                # Check clean mode config
+                if not glovar.configs[gid].get("clean", True):
                     continue
 
-                destruct = glovar.keywords[gid]["kws"][key]["destruct"]
+                # Destruct keywords messages
+                for key in list(glovar.message_ids[gid]["keywords"]):
+                    mid, time = glovar.message_ids[gid]["keywords"][key]
+                    keyword = glovar.keywords[gid]["kws"].get(key, {})
 
-                if now - time < destruct:
-                    continue
+                    if not keyword:
+                        journal("message_ids", "pop", (gid, "keywords", key))
+                        delete_message(client, gid, mid)
+                        continue
 
-                glovar.message_ids[gid]["keywords"][key] = (0, 0)
-                delete_message(client, gid, mid)
+                    if not mid:
+                        continue
 
-            # Destruct ot, rm, welcome message
-            for the_type in ["ot", "rm", "welcome"]:
-                mid, time = glovar.message_ids[gid][the_type]
+                    destruct = glovar.keywords[gid]["kws"][key]["destruct"]
 
-                if not mid:
-                    continue
+                    if now - time < destruct:
+                        continue
 
-                if now - time < eval(f"glovar.time_{the_type}"):
-                    continue
+                    journal("message_ids", "set", (gid, "keywords", key), (0, 0))
+                    delete_message(client, gid, mid)
+
+                # Destruct ot, rm, welcome message
+                for the_type in ["ot", "rm", "welcome"]:
+                    mid, time = glovar.message_ids[gid][the_type]
+
+                    if not mid:
+                        continue
 
-                glovar.message_ids[gid][the_type] = (0, 0)
-                delete_message(client, gid, mid)
+                    if now - time < eval(f"glovar.time_{the_type}"):
+                        continue
+
+                    journal("message_ids", "set", (gid, the_type), (0, 0))
+                    delete_message(client, gid, mid)
 
-        save("message_ids")
 
         # Generate a new invite link
         for gid in list(glovar.configs):
@@ -124,8 +173,6 @@ def interval_min_01(client: Client) -> bool:
         result = True
     except Exception as e:
         logger.warning(f"Interval min 01 error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
@@ -134,18 +181,19 @@ def interval_min_10() -> bool:
     # Execute every 10 minutes
     result = False
 
-    glovar.locks["message"].acquire()
-    
     try:
         # Clear keyworded users
         for gid in list(glovar.keyworded_ids):
-            glovar.keyworded_ids[gid] = {}
+            with get_group_lock(gid):
+                glovar.keyworded_ids[gid] = {}
+
+        # Compact the journals
+        for file in glovar.journal_files:
+            glovar.journal_counts.get(file) and save(file)
 
         result = True
     except Exception as e:
         logger.warning(f"Interval min 10 error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
@@ -182,25 +230,22 @@ def resend_link(client: Client) -> bool:
     # Resend the invite link
     result = False
 
-    glovar.locks["message"].acquire()
-
     try:
         # Proceed
         for gid in list(glovar.configs):
             if not glovar.configs[gid].get("resend", False):
                 continue
 
-            get_invite_link(
-                client=client,
-                the_type="send",
-                gid=gid
-            )
+            with get_group_lock(gid):
+                get_invite_link(
+                    client=client,
+                    the_type="send",
+                    gid=gid
+                )
 
         result = True
     except Exception as e:
         logger.warning(f"Resend link error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
@@ -209,33 +254,32 @@ def reset_count() -> bool:
     # Reset count data
     result = False
 
-    glovar.locks["message"].acquire()
-
     try:
         # Keywords
         for gid in list(glovar.keywords):
-            for key in list(glovar.keywords[gid]["kws"]):
-                glovar.keywords[gid]["kws"][key]["today"] = 0
+            with get_group_lock(gid):
+                for key in list(glovar.keywords[gid]["kws"]):
+                    glovar.keywords[gid]["kws"][key]["today"] = 0
 
         save("keywords")
 
         # RM
         for gid in list(glovar.rms):
-            glovar.rms[gid]["today"] = 0
+            with get_group_lock(gid):
+                glovar.rms[gid]["today"] = 0
 
         save("rms")
 
         # Welcome
         for gid in list(glovar.welcomes):
-            glovar.welcomes[gid]["today"] = 0
+            with get_group_lock(gid):
+                glovar.welcomes[gid]["today"] = 0
 
         save("welcomes")
 
         result = True
     except Exception as e:
         logger.warning(f"Reset count error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
@@ -256,14 +300,8 @@ def reset_data(client: Client) -> bool:
         glovar.left_group_ids = set()
         save("left_group_ids")
 
-        glovar.user_ids = {}
-        save("user_ids")
-
-        glovar.watch_ids = {
-            "ban": {},
-            "delete": {}
-        }
-        save("watch_ids")
+        clear_users()
+        clear_watches("all")
 
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
@@ -283,17 +321,25 @@ def send_count(client: Client) -> bool:
     # Send regex count to REGEX
     result = False
 
+    flush_count()
+
     glovar.locks["regex"].acquire()
 
     try:
         for word_type in glovar.regex:
             share_regex_count(client, word_type)
-            word_list = list(eval(f"glovar.{word_type}_words"))
 
-            for word in word_list:
-                eval(f"glovar.{word_type}_words")[word] = 0
+            # Reset the counts of old data
+            words = eval(f"glovar.{word_type}_words")
 
-            save(f"{word_type}_words")
+            if any(words.values()):
+                for word in list(words):
+                    words[word] = 0
+
+                save(f"{word_type}_words")
+
+        glovar.regex_counts = {}
+        save("regex_counts")
 
         result = True
     except Exception as e:
@@ -468,10 +514,7 @@ def update_members(client: Client) -> bool:
                     continue
 
                 # Save member ids
-                with glovar.locks["message"]:
-                    glovar.member_ids[gid] = member_ids
-
-                save("member_ids")
+                set_members(gid, member_ids)
             except Exception as e:
                 logger.warning(f"Update members in {gid} error: {e}", exc_info=True)
 
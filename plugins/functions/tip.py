@@ -22,12 +22,15 @@ from pyrogram import Client
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, User
 
 from .. import glovar
-from .decorators import threaded
+from .actions import run_step, take_token
+from .decorators import queued
 from .etc import code, get_now, get_replaced, get_text_user, lang
-from .file import save
+from .file import journal, save
 from .filters import is_keyworded_user, is_should_terminate
 from .group import delete_message
+from .locks import get_group_lock
 from .markup import get_text_and_markup_tip
+from .store import add_welcomed, is_welcomed
 from .telegram import edit_message_text, export_chat_invite_link, send_message
 from .user import terminate_user
 
@@ -143,10 +146,18 @@ def get_invite_link(client: Client, the_type: str, gid: int, manual: bool = Fals
     return result
 
 
+@queued("keyword")
 def tip_keyword(client: Client, message: Message, data: dict) -> bool:
     # Send keyword tip
     result = False
 
+    # Take the token before the group lock
+    if not take_token(message.chat.id):
+        return False
+
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
+
     try:
         # Basic data
         gid = message.chat.id
@@ -183,29 +194,35 @@ def tip_keyword(client: Client, message: Message, data: dict) -> bool:
         text = get_replaced(text, gid, user, destruct)
 
         # Send the tip
-        result = send_message(client, gid, text, mid, markup)
+        result = run_step("send", send_message, client, gid, text, mid, markup)
 
         if not result:
             return False
 
         mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
         mid and delete_message(client, gid, mid)
-        glovar.message_ids[gid]["keywords"][key] = (result.message_id, now)
-        save("message_ids")
+        journal("message_ids", "set", (gid, "keywords", key), (result.message_id, now))
         
         result = True
     except Exception as e:
         logger.warning(f"Tip keyword error: {e}", exc_info=True)
+    finally:
+        lock.release()
 
     return result
 
 
-@threaded()
+@queued("tip")
 def tip_saved(client: Client, gid: int, user: User, key: str) -> bool:
     # Send saved tip
     result = False
 
-    glovar.locks["message"].acquire()
+    # Take the token before the group lock
+    if not take_token(gid):
+        return False
+
+    lock = get_group_lock(gid)
+    lock.acquire()
 
     try:
         # Basic data
@@ -224,31 +241,35 @@ def tip_saved(client: Client, gid: int, user: User, key: str) -> bool:
         text = get_text_user(text, user)
 
         # Send the tip
-        result = send_message(client, gid, text, None, markup)
+        result = run_step("send", send_message, client, gid, text, None, markup)
 
         if not result:
             return False
 
         mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
         mid and delete_message(client, gid, mid)
-        glovar.message_ids[gid]["keywords"][key] = (result.message_id, now)
-        save("message_ids")
+        journal("message_ids", "set", (gid, "keywords", key), (result.message_id, now))
 
         result = True
     except Exception as e:
         logger.warning(f"Tip saved error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return result
 
 
-@threaded()
+@queued("tip")
 def tip_ot(client: Client, gid: int, mid: int = None) -> bool:
     # Send OT tip
     result = False
 
-    glovar.locks["message"].acquire()
+    # Take the token before the group lock
+    if not take_token(gid):
+        return False
+
+    lock = get_group_lock(gid)
+    lock.acquire()
 
     try:
         # Basic data
@@ -263,31 +284,35 @@ def tip_ot(client: Client, gid: int, mid: int = None) -> bool:
         text, markup = get_text_and_markup_tip(gid, reply)
 
         # Send the tip
-        result = send_message(client, gid, text, mid, markup)
+        result = run_step("send", send_message, client, gid, text, mid, markup)
 
         if not result:
             return False
 
         mid, _ = glovar.message_ids[gid]["ot"]
         mid and delete_message(client, gid, mid)
-        glovar.message_ids[gid]["ot"] = (result.message_id, now)
-        save("message_ids")
+        journal("message_ids", "set", (gid, "ot"), (result.message_id, now))
         
         result = True
     except Exception as e:
         logger.warning(f"Tip ot error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return result
 
 
-@threaded()
+@queued("tip")
 def tip_rm(client: Client, gid: int, mid: int = None) -> bool:
     # Send RM tip
     result = False
 
-    glovar.locks["message"].acquire()
+    # Take the token before the group lock
+    if not take_token(gid):
+        return False
+
+    lock = get_group_lock(gid)
+    lock.acquire()
 
     try:
         # Basic data
@@ -302,31 +327,35 @@ def tip_rm(client: Client, gid: int, mid: int = None) -> bool:
         text, markup = get_text_and_markup_tip(gid, reply)
 
         # Send the tip
-        result = send_message(client, gid, text, mid, markup)
+        result = run_step("send", send_message, client, gid, text, mid, markup)
 
         if not result:
             return False
 
         mid, _ = glovar.message_ids[gid]["rm"]
         mid and delete_message(client, gid, mid)
-        glovar.message_ids[gid]["rm"] = (result.message_id, now)
-        save("message_ids")
+        journal("message_ids", "set", (gid, "rm"), (result.message_id, now))
         
         result = True
     except Exception as e:
         logger.warning(f"Tip rm error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
     
     return result
 
 
-@threaded()
+@queued("tip")
 def tip_welcome(client: Client, user: User, gid: int = 0, mid: int = None, force: bool = False) -> bool:
     # Send welcome tip
     result = False
 
-    glovar.locks["message"].acquire()
+    # Take the token before the group lock
+    if not take_token(gid):
+        return False
+
+    lock = get_group_lock(gid)
+    lock.acquire()
 
     try:
         # Basic data
@@ -338,11 +367,9 @@ def tip_welcome(client: Client, user: User, gid: int = 0, mid: int = None, force
         if not glovar.configs[gid].get("welcome", True) or not reply:
             return False
 
-        # Check welcome status
-        if not force and uid in glovar.welcomed_ids[gid]:
+        # Check welcome status, the user is added after the tip is sent, so that a deferred tip is sent again
+        if not force and is_welcomed(gid, uid):
             return False
-        else:
-            glovar.welcomed_ids[gid].add(uid)
 
         # Get the markup
         text, markup = get_text_and_markup_tip(gid, reply)
@@ -355,20 +382,20 @@ def tip_welcome(client: Client, user: User, gid: int = 0, mid: int = None, force
         text = get_text_user(text, user)
 
         # Send the tip
-        result = send_message(client, gid, text, mid, markup)
+        result = run_step("send", send_message, client, gid, text, mid, markup)
 
         if not result:
             return False
 
+        add_welcomed(gid, uid)
         mid, _ = glovar.message_ids[gid]["welcome"]
         mid and delete_message(client, gid, mid)
-        glovar.message_ids[gid]["welcome"] = (result.message_id, now)
-        save("message_ids")
+        journal("message_ids", "set", (gid, "welcome"), (result.message_id, now))
 
         result = True
     except Exception as e:
         logger.warning(f"Tip welcome error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return result
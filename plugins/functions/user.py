@@ -25,13 +25,15 @@ from pyrogram import Client
 from pyrogram.types import ChatPermissions, Message, User
 
 from .. import glovar
+from .actions import run_step, take_token
 from .channel import forward_evidence, send_debug
 from .config import kws_action
-from .decorators import threaded
+from .decorators import queued, threaded
 from .etc import get_int, get_now, get_replaced, lang, random_str
-from .file import save
+from .file import journal, save
 from .filters import is_class_d_user, is_keyworded_user, is_should_pass
 from .group import delete_message
+from .locks import get_group_lock
 from .markup import get_text_and_markup_tip
 from .telegram import kick_chat_member, restrict_chat_member, send_message, unban_chat_member
 
@@ -141,6 +143,72 @@ def kick_user(client: Client, gid: int, uid: Union[int, str], until_date: int =
     return result
 
 
+@queued("terminate")
+def punish_user(client: Client, message: Message, data: dict, link: str, should_pass: bool) -> bool:
+    # Delete the message, punish the user and reply the tip with the evidence link
+    result = False
+
+    # Take the token before the group lock
+    if not take_token(message.chat.id):
+        return False
+
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
+
+    try:
+        # Basic data
+        gid = message.chat.id
+        mid = message.message_id
+        user = get_user_from_message(message)
+        uid = user.id
+        key = data["key"]
+        reply = data["reply"]
+        actions = data["actions"]
+        destruct = data["destruct"]
+        now = get_now()
+
+        # Delete the message
+        if "delete" in actions:
+            run_step("delete", delete_message, client, gid, mid)
+
+        # Kick, ban, restrict the user
+        if not should_pass and "kick" in actions:
+            run_step("punish", kick_user, client, gid, uid)
+        elif not should_pass and "ban" in actions:
+            run_step("punish", ban_user, client, gid, uid)
+        elif not should_pass and "restrict" in actions:
+            run_step("punish", restrict_user, client, gid, uid)
+        elif not should_pass and any(a.startswith("ban-") or a.startswith("restrict-") for a in actions):
+            run_step("punish", time_user, client, gid, uid, now, actions)
+
+        # Check reply action
+        if "reply" not in actions:
+            return False
+
+        # Get the markup
+        text, markup = get_text_and_markup_tip(gid, reply)
+        text = get_replaced(text, gid, user, destruct)
+        text = text.replace("$evidence_link", link)
+
+        # Send the tip
+        result = run_step("send", send_message, client, gid, text, mid, markup)
+
+        if not result:
+            return False
+
+        mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
+        mid and delete_message(client, gid, mid)
+        journal("message_ids", "set", (gid, "keywords", key), (result.message_id, now))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Punish user error: {e}", exc_info=True)
+    finally:
+        lock.release()
+
+    return result
+
+
 @threaded()
 def restrict_user(client: Client, gid: int, uid: Union[int, str], until_date: int = 0) -> bool:
     # Restrict a user
@@ -154,8 +222,9 @@ def restrict_user(client: Client, gid: int, uid: Union[int, str], until_date: in
     return result
 
 
+@queued("evidence")
 def terminate_user(client: Client, message: Message, data: dict) -> bool:
-    # Terminate user
+    # Terminate user, forward the evidence first, then queue the punishment
     result = False
 
     try:
@@ -165,12 +234,9 @@ def terminate_user(client: Client, message: Message, data: dict) -> bool:
         user = get_user_from_message(message)
         uid = user.id
         key = data["key"]
-        reply = data["reply"]
         actions = data["actions"]
-        destruct = data["destruct"]
         forward = data["forward"]
         name = data["name"]
-        now = get_now()
 
         # Get pass status
         should_pass = is_should_pass(message, True)
@@ -183,9 +249,11 @@ def terminate_user(client: Client, message: Message, data: dict) -> bool:
         if is_keyworded_user(gid, key, uid):
             return delete_message(client, gid, mid)
 
-        # Terminate
+        # Forward the evidence
         action = get_action_text(actions)
-        result = forward_evidence(
+        result = run_step(
+            "evidence",
+            forward_evidence,
             client=client,
             message=message,
             user=user,
@@ -209,41 +277,7 @@ def terminate_user(client: Client, message: Message, data: dict) -> bool:
             em=result
         )
 
-        # Delete the message
-        if "delete" in actions:
-            delete_message(client, gid, mid)
-
-        # Kick, ban, restrict the user
-        if not should_pass and "kick" in actions:
-            kick_user(client, gid, uid)
-        elif not should_pass and "ban" in actions:
-            ban_user(client, gid, uid)
-        elif not should_pass and "restrict" in actions:
-            restrict_user(client, gid, uid)
-        elif not should_pass and any(a.startswith("ban-") or a.startswith("restrict-") for a in actions):
-            time_user(client, gid, uid, now, actions)
-
-        # Check reply action
-        if "reply" not in actions:
-            return False
-
-        # Get the markup
-        text, markup = get_text_and_markup_tip(gid, reply)
-        text = get_replaced(text, gid, user, destruct)
-        text = text.replace("$evidence_link", result.link)
-
-        # Send the tip
-        result = send_message(client, gid, text, mid, markup)
-
-        if not result:
-            return False
-
-        mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
-        mid and delete_message(client, gid, mid)
-        glovar.message_ids[gid]["keywords"][key] = (result.message_id, now)
-        save("message_ids")
-
-        result = True
+        result = punish_user(client, message, data, result.link, should_pass)
     except Exception as e:
         logger.warning(f"Terminate user error: {e}", exc_info=True)
 
@@ -18,18 +18,22 @@
 
 import logging
 import pickle
+from asyncio import AbstractEventLoop
 from codecs import getdecoder
 from configparser import RawConfigParser
 from os.path import exists
+from queue import PriorityQueue
+from sqlite3 import Connection
 from string import ascii_lowercase
-from threading import Lock
-from typing import Dict, List, Set, Tuple, Union
+from threading import Event, Lock, RLock
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple, Union
 
 from pyrogram import emoji
 from pyrogram.types import Chat, ChatMember
 from yaml import safe_load
 
 from .checker import check_all, raise_error
+from .snapshot import dump_snapshot, load_snapshot, replay_journals
 from .version import version_control
 
 # Path variables
@@ -41,6 +45,7 @@ PICKLE_PATH = "data/pickle"
 JOIN_PATH = "data/config/join.txt"
 SESSION_DIR_PATH = "data/session"
 SESSION_PATH = "data/session/bot.session"
+SQLITE_PATH = "data/store.db"
 START_PATH = "data/config/start.txt"
 TMP_PATH = "data/tmp"
 
@@ -115,15 +120,30 @@ lang: str = "cmn-Hans"
 normalize: Union[bool, str] = "True"
 
 # [mode]
+adaptive: Union[bool, str] = "False"
 aio: Union[bool, str] = "False"
+asyncio: Union[bool, str] = "False"
 backup: Union[bool, str] = "False"
+guard: Union[bool, str] = "False"
+multi: Union[bool, str] = "False"
+sqlite: Union[bool, str] = "False"
+
+# [pool]
+pool_exchange: int = 4
+pool_io: int = 16
+pool_overflow: str = "caller"
+pool_persistence: int = 2
+pool_queue: int = 1000
 
 # [time]
 date_reset: str = "1st mon"
+time_bio: int = 300
 time_channel: int = 0
 time_keyword: int = 0
 time_ot: int = 0
+time_regex: int = 5
 time_rm: int = 0
+time_save: int = 5
 time_welcome: int = 0
 
 try:
@@ -188,17 +208,37 @@ try:
     normalize = eval(normalize)
 
     # [mode]
+    adaptive = config.get("mode", "adaptive", fallback=adaptive)
+    adaptive = eval(adaptive)
     aio = config.get("mode", "aio", fallback=aio)
     aio = eval(aio)
+    asyncio = config.get("mode", "asyncio", fallback=asyncio)
+    asyncio = eval(asyncio)
     backup = config.get("mode", "backup", fallback=backup)
     backup = eval(backup)
+    guard = config.get("mode", "guard", fallback=guard)
+    guard = eval(guard)
+    multi = config.get("mode", "multi", fallback=multi)
+    multi = eval(multi)
+    sqlite = config.get("mode", "sqlite", fallback=sqlite)
+    sqlite = eval(sqlite)
+
+    # [pool]
+    pool_exchange = int(config.get("pool", "pool_exchange", fallback=pool_exchange))
+    pool_io = int(config.get("pool", "pool_io", fallback=pool_io))
+    pool_overflow = config.get("pool", "pool_overflow", fallback=pool_overflow)
+    pool_persistence = int(config.get("pool", "pool_persistence", fallback=pool_persistence))
+    pool_queue = int(config.get("pool", "pool_queue", fallback=pool_queue))
 
     # [time]
     date_reset = config.get("time", "date_reset", fallback=date_reset)
+    time_bio = int(config.get("time", "time_bio", fallback=time_bio))
     time_channel = int(config.get("time", "time_channel", fallback=time_channel))
     time_keyword = int(config.get("time", "time_keyword", fallback=time_keyword))
     time_ot = int(config.get("time", "time_ot", fallback=time_ot))
+    time_regex = int(config.get("time", "time_regex", fallback=time_regex))
     time_rm = int(config.get("time", "time_rm", fallback=time_rm))
+    time_save = int(config.get("time", "time_save", fallback=time_save))
     time_welcome = int(config.get("time", "time_welcome", fallback=time_welcome))
 
     # [flag]
@@ -263,15 +303,30 @@ check_all(
             "normalize": normalize
         },
         "mode": {
+            "adaptive": adaptive,
             "aio": aio,
-            "backup": backup
+            "asyncio": asyncio,
+            "backup": backup,
+            "guard": guard,
+            "multi": multi,
+            "sqlite": sqlite
+        },
+        "pool": {
+            "pool_exchange": pool_exchange,
+            "pool_io": pool_io,
+            "pool_overflow": pool_overflow,
+            "pool_persistence": pool_persistence,
+            "pool_queue": pool_queue
         },
         "time": {
             "date_reset": date_reset,
+            "time_bio": time_bio,
             "time_channel": time_channel,
             "time_keyword": time_keyword,
             "time_ot": time_ot,
+            "time_regex": time_regex,
             "time_rm": time_rm,
+            "time_save": time_save,
             "time_welcome": time_welcome
         }
     },
@@ -315,16 +370,40 @@ all_commands: List[str] = [
 bot_ids: Set[int] = {avatar_id, captcha_id, clean_id, index_id, lang_id, long_id,
                      noflood_id, noporn_id, nospam_id, tip_id, user_id, warn_id}
 
+action_stats: Dict[str, List[float]] = {}
+# action_stats = {
+#     "keyword": [1, 0.01, 0.5]
+# }
+
+actions: PriorityQueue = PriorityQueue()
+# actions.get() = (0.0, 1, Action)
+
 chats: Dict[int, Chat] = {}
 # chats = {
 #     -10012345678: Chat
 # }
 
+compiled: Dict[str, Dict[str, Optional[Pattern]]] = {}
+# compiled = {
+#     "ad": {
+#         "regex": re.compile("regex", re.I | re.S | re.M)
+#     }
+# }
+
+database: Optional[Connection] = None
+
 declared_message_ids: Dict[int, Set[int]] = {}
 # declared_message_ids = {
 #     -10012345678: {123}
 # }
 
+dirty_event: Event = Event()
+
+dirty_files: Dict[str, float] = {}
+# dirty_files = {
+#     "member_ids": 1512345678.0
+# }
+
 default_channel_data: Dict[str, Union[int, str]] = {
     "aid": 0,
     "cid": 0,
@@ -403,11 +482,51 @@ default_welcome_data: Dict[str, Union[int, str]] = {
 
 emoji_set: Set[str] = {v for k, v in vars(emoji).items() if not k.startswith("_")}
 
+emoji_starts: Optional[Pattern] = None
+
+emoji_trie: Dict[str, dict] = {}
+# emoji_trie = {
+#     "\U0001F44D": {
+#         "": True,
+#         "\U0001F3FB": {
+#             "": True
+#         }
+#     }
+# }
+
+file_seqs: Dict[str, int] = {}
+# file_seqs = {
+#     "member_ids": 123
+# }
+
+group_locks: List[RLock] = [RLock() for _ in range(64)]
+
 hold_ids: Dict[int, str] = {}
 # hold_ids = {
 #     -10012345678: "random"
 # }
 
+journal_bases: Dict[str, int] = {}
+# journal_bases = {
+#     "member_ids": 123
+# }
+
+journal_counts: Dict[str, int] = {}
+# journal_counts = {
+#     "member_ids": 0
+# }
+
+keyword_indexes: Dict[int, Dict[str, Any]] = {}
+# keyword_indexes = {
+#     -10012345678: {
+#         "words": {True: {"word": {"tag": ("word", False)}}, False: {}},
+#         "automatons": {True: Automaton, False: Automaton},
+#         "set": re2.Set,
+#         "regex": [("tag", "regex")],
+#         "fallback": []
+#     }
+# }
+
 keyworded_ids: Dict[int, Dict[int, Set[str]]] = {}
 # keyworded_ids = {
 #     -10012345678: {
@@ -415,15 +534,37 @@ keyworded_ids: Dict[int, Dict[int, Set[str]]] = {}
 #     }
 # }
 
+# Lock order, a thread only waits for locks which come later than the ones it holds:
+# 1. "receive": held by process_data for a whole exchange update, the receive functions take the locks below
+# 2. "message": data shared by all groups, such as bad, user and watch ids
+# 3. One group lock of group_locks, never two at the same time
+# 4. "admin", "channel", "config", "regex"
+# 5. "store", "journal", "file"
+# The "save" lock is held only by the file writer, which takes the locks of the data after it
 locks: Dict[str, Lock] = {
     "admin": Lock(),
     "channel": Lock(),
     "config": Lock(),
+    "file": Lock(),
+    "journal": Lock(),
     "message": Lock(),
     "receive": Lock(),
-    "regex": Lock()
+    "regex": Lock(),
+    "save": Lock(),
+    "store": Lock()
 }
 
+loop: Optional[AbstractEventLoop] = None
+
+matcher: Dict[str, Any] = {}
+# matcher = {
+#     "set": re2.Set,
+#     "index": [("ad", "regex")],
+#     "fallback": {
+#         "ad": {"python_only_regex"}
+#     }
+# }
+
 members: Dict[int, Dict[int, ChatMember]] = {}
 # members = {
 #     -10012345678: {
@@ -458,13 +599,39 @@ regex: Dict[str, bool] = {
 for c in ascii_lowercase:
     regex[f"ad{c}"] = False
 
+regex_scores: Dict[str, Dict[str, float]] = {}
+# regex_scores = {
+#     "ad": {
+#         "regex": 1.5
+#     }
+# }
+
+regex_versions: Dict[str, int] = {}
+# regex_versions = {
+#     "ad": 1
+# }
+
 sender: str = "TIP"
 
 should_hide: bool = False
 
+special_ascii: bool = False
+
+special_table: Dict[int, str] = {}
+# special_table = {
+#     ord("Ａ"): "A"
+# }
+
+special_version: int = 0
+
 started_ids: Set[int] = set()
 # started_ids = {12345678}
 
+suspect_words: Dict[str, Any] = {}
+# suspect_words = {
+#     "suspect_regex": re2.compile("prefilter")
+# }
+
 updating: bool = False
 
 version: str = "0.2.8"
@@ -662,6 +829,13 @@ ots: Dict[int, Dict[str, Union[int, str]]] = {}
 #     }
 # }
 
+regex_counts: Dict[str, Dict[str, int]] = {}
+# regex_counts = {
+#     "ad": {
+#         "regex": 1
+#     }
+# }
+
 rms: Dict[int, Dict[str, Union[int, str]]] = {}
 # rms = {
 #     -10012345678: {
@@ -714,27 +888,31 @@ for word_type in regex:
 file_list: List[str] = ["admin_ids", "bad_ids", "flooded_ids", "group_ids", "ignore_ids", "lack_group_ids",
                         "left_group_ids", "member_ids", "message_ids", "pinned_ids", "trust_ids", "user_ids",
                         "watch_ids", "white_ids",
-                        "channels", "configs", "current", "keywords", "ots", "rms", "starts", "timeout_words",
-                        "token", "welcomes"]
+                        "channels", "configs", "current", "keywords", "ots", "regex_counts", "rms", "starts",
+                        "timeout_words", "token", "welcomes"]
 file_list += [f"{f}_words" for f in regex]
 
+# Small changes of these files are appended to journals, which are compacted into the snapshots
+journal_files: List[str] = ["member_ids", "message_ids", "user_ids", "watch_ids"]
+
+# These files are kept in the database in the SQLite mode, the global variables stay empty
+store_files: List[str] = ["member_ids", "user_ids", "watch_ids"]
+
 for file in file_list:
-    try:
-        try:
-            if exists(f"{PICKLE_PATH}/{file}") or exists(f"{PICKLE_BACKUP_PATH}/{file}"):
-                with open(f"{PICKLE_PATH}/{file}", "rb") as f:
-                    locals()[f"{file}"] = pickle.load(f)
-            else:
-                with open(f"{PICKLE_PATH}/{file}", "wb") as f:
-                    pickle.dump(eval(f"{file}"), f)
-        except Exception as e:
-            logger.error(f"Load data {file} error: {e}", exc_info=True)
-
-            with open(f"{PICKLE_BACKUP_PATH}/{file}", "rb") as f:
-                locals()[f"{file}"] = pickle.load(f)
-    except Exception as e:
-        logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
+    paths = [f"{PICKLE_PATH}/{file}", f"{PICKLE_PATH}/{file}.tmp", f"{PICKLE_BACKUP_PATH}/{file}"]
+    loaded, seq, data = load_snapshot(paths)
+
+    if loaded:
+        locals()[f"{file}"] = data
+        file_seqs[file] = seq
+
+        if file in journal_files:
+            journal_bases[file], journal_counts[file] = replay_journals(PICKLE_PATH, file, data, seq)
+    elif any(exists(path) for path in paths):
+        logger.critical(f"Load data {file} error: no valid snapshot")
         raise SystemExit("[DATA CORRUPTION]")
+    else:
+        dump_snapshot(paths[0], paths[2], pickle.dumps(eval(f"{file}")), 0)
 
 # Generate special characters dictionary
 for special in ["spc", "spe"]:
@@ -0,0 +1,66 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pickle
+import re
+import sys
+from struct import unpack
+
+# This module runs as a separate process: python -m plugins.guard
+# Request: 4 bytes big-endian length + pickled (words, text)
+# Response: one byte for every checked word, b"1" for a hit (then stop), b"0" for a miss
+
+
+def guard() -> bool:
+    # Check the requested texts until the parent process closes the pipe
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    patterns = {}
+
+    while True:
+        head = stdin.read(4)
+
+        if len(head) < 4:
+            return True
+
+        words, text = pickle.loads(stdin.read(unpack(">I", head)[0]))
+
+        if len(patterns) > 4096:
+            patterns = {}
+
+        for word in words:
+            pattern = patterns.get(word)
+
+            if pattern is None:
+                try:
+                    pattern = re.compile(word, re.I | re.S | re.M)
+                except re.error:
+                    pattern = False
+
+                patterns[word] = pattern
+
+            hit = bool(pattern and pattern.search(text))
+            stdout.write(b"1" if hit else b"0")
+            stdout.flush()
+
+            if hit:
+                break
+
+
+if __name__ == "__main__":
+    guard()
@@ -25,6 +25,7 @@ from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 
 from .. import glovar
+from ..functions.actions import get_action_stats
 from ..functions.channel import get_debug_text, send_debug, share_data
 from ..functions.command import (command_error, delete_normal_command, delete_shared_command, get_command_context,
                                  get_command_type)
@@ -32,10 +33,13 @@ from ..functions.config import (conflict_config, get_config_text, kws_add, kws_c
                                 kws_config_gid, kws_remove, kws_show, start_kws, update_config)
 from ..functions.etc import (code, code_block, general_link, get_int, get_now, get_readable_time, lang,
                              mention_id, random_str, thread)
+from ..functions.executor import get_pool_stats
 from ..functions.file import save
 from ..functions.filters import (authorized_group, class_e, from_user, is_class_c, is_class_e_user, is_from_user,
-                                 test_group)
+                                 regex_verdicts, test_group)
 from ..functions.group import pin_hold
+from ..functions.keywords import get_keyword_memory
+from ..functions.locks import get_group_lock
 from ..functions.markup import get_text_and_markup, get_text_and_markup_tip
 from ..functions.program import restart_program, update_program
 from ..functions.telegram import (forward_messages, get_chat, get_group_info, get_start, send_message,
@@ -530,7 +534,8 @@ def config_tip(client: Client, message: Message) -> bool:
     # Config tip
     result = False
 
-    glovar.locks["message"].acquire()
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
 
     try:
         # Basic data
@@ -628,7 +633,7 @@ def config_tip(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Config tip error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
         delete_normal_command(client, message)
 
     return result
@@ -1201,6 +1206,14 @@ def version(client: Client, message: Message) -> bool:
         git_hash = run("git rev-parse --short HEAD", stdout=PIPE, shell=True).stdout.decode()
         get_hash_link = f"https://github.com/scp-079/scp-079-{glovar.sender.lower()}/commit/{git_hash}"
         command_date = get_readable_time(message.date, "%Y/%m/%d %H:%M:%S")
+        cache_stats = regex_verdicts.stats()
+        cache_regex = f"{cache_stats['hits']} / {cache_stats['misses']} / {cache_stats['size']}"
+        cache_keyword = " / ".join(str(i) for i in get_keyword_memory())
+        action_stats = get_action_stats()
+        action_queue = " / ".join(str(action_stats.get(k, 0)) for k in ["depth", "done", "wait", "run"])
+        pool_stats = get_pool_stats()
+        thread_pools = "\n".join(f"{name}: " + " / ".join(str(s[k]) for k in ["active", "queued", "completed", "rejected"])
+                                  for name, s in pool_stats.items())
 
         # Generate the text
         text = (f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n\n"
@@ -1209,6 +1222,10 @@ def version(client: Client, message: Message) -> bool:
                 f"{lang('git_change')}{lang('colon')}{code(git_change)}\n"
                 f"{lang('git_hash')}{lang('colon')}{general_link(git_hash, get_hash_link)}\n"
                 f"{lang('git_date')}{lang('colon')}{code(git_date)}\n"
+                f"{lang('cache_regex')}{lang('colon')}{code(cache_regex)}\n"
+                f"{lang('cache_keyword')}{lang('colon')}{code(cache_keyword)}\n"
+                f"{lang('action_queue')}{lang('colon')}{code(action_queue)}\n"
+                f"{lang('thread_pools')}{lang('colon')}{code_block(thread_pools)}\n"
                 f"{lang('command_date')}{lang('colon')}{code(command_date)}\n")
 
         # Send the report message
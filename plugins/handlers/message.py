@@ -23,6 +23,7 @@ from pyrogram.types import Message
 
 from .. import glovar
 from ..functions.channel import get_debug_text
+from ..functions.context import clear_context, init_context
 from ..functions.etc import code, delay, general_link, get_now, lang, mention_id, random_str, thread
 from ..functions.file import save
 from ..functions.filters import (aio, authorized_group, declared_message, exchange_channel, from_user, hide_channel,
@@ -30,12 +31,14 @@ from ..functions.filters import (aio, authorized_group, declared_message, exchan
                                  is_nospam_join, is_rm_text, is_user_class_d, is_watch_user, new_group, test_group)
 from ..functions.group import leave_group, leave_unauthorized, join_hint, pin_cancel, pin_hold, save_admins
 from ..functions.ids import init_group_id, init_user_id
+from ..functions.locks import get_group_lock
 from ..functions.receive import (receive_add_bad, receive_captcha_flood, receive_config_commit, receive_clear_data,
                                  receive_config_reply, receive_config_show, receive_declared_message, receive_group_id,
                                  receive_help_welcome, receive_ignore_ids, receive_leave_approve, receive_regex,
                                  receive_refresh, receive_remove_bad, receive_remove_flood, receive_remove_score,
                                  receive_remove_watch, receive_remove_white, receive_white_users, receive_rollback,
                                  receive_text_data, receive_user_score, receive_watch_user)
+from ..functions.store import add_member
 from ..functions.telegram import get_admins, send_message
 from ..functions.timers import backup_files, send_count
 from ..functions.tip import tip_keyword, tip_rm, tip_welcome
@@ -52,7 +55,9 @@ def check(client: Client, message: Message) -> bool:
     # Check the messages sent from groups
     result = False
 
-    glovar.locks["message"].acquire()
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
+    init_context(message)
 
     try:
         # Basic data
@@ -77,7 +82,7 @@ def check(client: Client, message: Message) -> bool:
             return True
 
         # Check keyword
-        detection = is_keyword_message(message)
+        detection = is_keyword_message(message, client)
 
         if detection:
             key = detection["key"]
@@ -99,7 +104,8 @@ def check(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        clear_context()
+        lock.release()
 
     return result
 
@@ -112,7 +118,9 @@ def check_join(client: Client, message: Message) -> bool:
     # Check new joined user
     result = False
 
-    glovar.locks["message"].acquire()
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
+    init_context(message)
 
     try:
         # Basic data
@@ -134,11 +142,10 @@ def check_join(client: Client, message: Message) -> bool:
             return False
 
         # Check keyword name
-        detection = is_keyword_message(message)
+        detection = is_keyword_message(message, client)
 
         if detection:
-            glovar.member_ids[gid].add(user.id)
-            save("member_ids")
+            add_member(gid, user.id)
             return tip_keyword(client, message, detection)
 
         # Check config
@@ -154,8 +161,7 @@ def check_join(client: Client, message: Message) -> bool:
             return False
 
         # Add to joined members
-        glovar.member_ids[gid].add(user.id)
-        save("member_ids")
+        add_member(gid, user.id)
 
         # User status
         if is_watch_user(user, "ban", now):
@@ -181,7 +187,52 @@ def check_join(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check join error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        clear_context()
+        lock.release()
+
+    return result
+
+
+@Client.on_message(filters.incoming & filters.group & filters.service & ~filters.new_chat_members
+                   & ~test_group & authorized_group
+                   & from_user
+                   & ~declared_message, group=1)
+def check_service(client: Client, message: Message) -> bool:
+    # Check the service messages other than joins, such as left members, with the service and leave keywords
+    result = False
+
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
+    init_context(message)
+
+    try:
+        # Basic data
+        gid = message.chat.id
+
+        # Check the config
+        if not glovar.configs[gid].get("keyword") or not glovar.keywords[gid].get("kws"):
+            return False
+
+        # Check class D status
+        if is_user_class_d(gid, message.from_user):
+            return False
+
+        # Check keyword
+        detection = is_keyword_message(message, client)
+
+        if detection:
+            key = detection["key"]
+            glovar.keywords[gid]["kws"][key]["count"] += 1
+            glovar.keywords[gid]["kws"][key]["today"] += 1
+            save("keywords")
+            return tip_keyword(client, message, detection)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Check service error: {e}", exc_info=True)
+    finally:
+        clear_context()
+        lock.release()
 
     return result
 
@@ -301,7 +352,8 @@ def pin_process(client: Client, message: Message) -> bool:
     # Process pinned message
     result = False
 
-    glovar.locks["message"].acquire()
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
 
     try:
         # Basic data
@@ -338,7 +390,7 @@ def pin_process(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Pin process error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return result
 
@@ -350,7 +402,8 @@ def pin_record(_: Client, message: Message) -> bool:
     # Record pinned message
     result = False
 
-    glovar.locks["message"].acquire()
+    lock = get_group_lock(message.chat.id)
+    lock.acquire()
 
     try:
         # Basic data
@@ -376,7 +429,7 @@ def pin_record(_: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Pin record error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return result
 
@@ -0,0 +1,272 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+import pickle
+from os import O_RDONLY, close, fsync, listdir, open as open_fd, remove, replace
+from os.path import dirname, exists
+from struct import Struct
+from typing import Any, Dict, List, Optional, Tuple
+from zlib import crc32
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Snapshot file: header + pickled data
+# Header: magic, format version, sequence number, CRC32 of the data, length of the data
+# Files without the magic are legacy pickles
+header = Struct(">4sHQIQ")
+magic = b"079S"
+version = 1
+
+# Journal file: header + records, named "<file>.<base>.journal", the base is the sequence number of the snapshot
+# Header: magic, base sequence number
+# Record: length and CRC32 of the data, then pickled (path, op, value), a torn tail is ignored
+journal_header = Struct(">4sQ")
+journal_magic = b"079J"
+record_header = Struct(">II")
+
+
+def append_journal(path: str, base: int, record: tuple) -> bool:
+    # Append a record to the journal, create the journal if necessary
+    result = False
+
+    try:
+        data = pickle.dumps(record)
+
+        with open(path, "ab") as f:
+            f.tell() or f.write(journal_header.pack(journal_magic, base))
+            f.write(record_header.pack(len(data), crc32(data)))
+            f.write(data)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Append journal {path} error: {e}", exc_info=True)
+
+    return result
+
+
+def apply_record(data: Any, record: tuple) -> bool:
+    # Apply a journal record to the data, all operations are idempotent, raise if the path does not exist
+    path, op, value = record
+    target = data
+
+    for key in path[:-1]:
+        target = target[key]
+
+    key = path[-1]
+
+    if op == "set":
+        target[key] = value
+    elif op == "pop":
+        target.pop(key, None)
+    elif op == "add":
+        target[key].add(value)
+    elif op == "discard":
+        target[key].discard(value)
+    else:
+        raise ValueError(f"Unknown journal operation {op}")
+
+    return True
+
+
+def clean_journals(directory: str, file: str, seq: int) -> bool:
+    # Delete the journals which are included by the snapshot of the sequence number
+    result = False
+
+    try:
+        for base, path in get_journals(directory, file).items():
+            base < seq and remove(path)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Clean journals {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def dump_snapshot(path: str, backup: str, data: bytes, seq: int) -> bool:
+    # Write the snapshot to a temp file, then rename it to the path, the previous snapshot becomes the backup
+    result = False
+
+    try:
+        tmp = f"{path}.tmp"
+
+        with open(tmp, "wb") as f:
+            f.write(header.pack(magic, version, seq, crc32(data), len(data)))
+            f.write(data)
+            f.flush()
+            fsync(f.fileno())
+
+        exists(path) and replace(path, backup)
+        replace(tmp, path)
+
+        for directory in {dirname(path), dirname(backup)}:
+            sync_directory(directory)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Dump snapshot {path} error: {e}", exc_info=True)
+
+    return result
+
+
+def get_journals(directory: str, file: str) -> Dict[int, str]:
+    # Get the journals of the file, keyed by their bases
+    result = {}
+
+    try:
+        for name in listdir(directory):
+            parts = name.split(".")
+
+            if len(parts) == 3 and parts[0] == file and parts[1].isdigit() and parts[2] == "journal":
+                result[int(parts[1])] = f"{directory}/{name}"
+    except Exception as e:
+        logger.warning(f"Get journals {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def load_journal(path: str) -> List[tuple]:
+    # Load the records of the journal until the first torn or corrupted one
+    result = []
+
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+
+        if not raw.startswith(journal_magic) or len(raw) < journal_header.size:
+            return []
+
+        offset = journal_header.size
+
+        while offset + record_header.size <= len(raw):
+            length, checksum = record_header.unpack_from(raw, offset)
+            data = raw[offset + record_header.size:offset + record_header.size + length]
+
+            if len(data) != length or crc32(data) != checksum:
+                logger.error(f"Journal {path} is torn at {offset}")
+                break
+
+            result.append(pickle.loads(data))
+            offset += record_header.size + length
+    except Exception as e:
+        logger.warning(f"Load journal {path} error: {e}", exc_info=True)
+
+    return result
+
+
+def load_snapshot(paths: List[str]) -> Tuple[bool, int, Any]:
+    # Load the newest valid snapshot of the paths, earlier paths win between legacy pickles
+    result = (False, 0, None)
+
+    try:
+        candidates = []
+
+        for order, path in enumerate(paths):
+            seq, data = read_snapshot(path)
+
+            if data is not None:
+                candidates.append((seq, -order, path, data))
+
+        # Only legacy pickles may fail to load here, the others have been checked
+        for seq, _, path, data in sorted(candidates, reverse=True):
+            try:
+                return True, max(seq, 0), pickle.loads(data)
+            except Exception as e:
+                logger.error(f"Load snapshot {path} error: {e}", exc_info=True)
+    except Exception as e:
+        logger.warning(f"Load snapshot error: {e}", exc_info=True)
+
+    return result
+
+
+def read_snapshot(path: str) -> Tuple[int, Optional[bytes]]:
+    # Read the sequence number and the data of a snapshot without unpickling it, -1 for a legacy pickle
+    result = (0, None)
+
+    try:
+        if not exists(path):
+            return 0, None
+
+        with open(path, "rb") as f:
+            raw = f.read()
+
+        if not raw.startswith(magic):
+            return -1, raw or None
+
+        if len(raw) < header.size:
+            logger.error(f"Snapshot {path} is truncated")
+            return 0, None
+
+        _, file_version, seq, checksum, length = header.unpack_from(raw)
+        data = raw[header.size:]
+
+        if file_version > version or length != len(data) or checksum != crc32(data):
+            logger.error(f"Snapshot {path} is corrupted")
+            return 0, None
+
+        result = (seq, data)
+    except Exception as e:
+        logger.warning(f"Read snapshot {path} error: {e}", exc_info=True)
+
+    return result
+
+
+def replay_journals(directory: str, file: str, data: Any, seq: int) -> Tuple[int, int]:
+    # Replay the journals on the snapshot of the sequence number, return the base to append to and the record count
+    result = (seq, 0)
+
+    try:
+        clean_journals(directory, file, seq)
+        journals = get_journals(directory, file)
+        count = 0
+
+        for base in sorted(journals):
+            for record in load_journal(journals[base]):
+                try:
+                    apply_record(data, record)
+                    count += 1
+                except Exception as e:
+                    logger.error(f"Replay {file} record {record} error: {e}")
+
+        result = (max([seq] + list(journals)), count)
+    except Exception as e:
+        logger.warning(f"Replay journals {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def sync_directory(path: str) -> bool:
+    # Flush the directory entries to the disk
+    result = False
+
+    try:
+        fd = open_fd(path or ".", O_RDONLY)
+
+        try:
+            fsync(fd)
+        finally:
+            close(fd)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Sync directory {path} error: {e}", exc_info=True)
+
+    return result
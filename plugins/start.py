@@ -19,7 +19,13 @@
 import logging
 
 from . import glovar
-from .functions.file import delete_file, save
+from .functions.actions import init_actions
+from .functions.etc import init_special
+from .functions.file import delete_file, save, save_worker
+from .functions.emoji import init_emoji
+from .functions.executor import start_thread
+from .functions.regex import init_regex
+from .functions.store import init_store
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -30,6 +36,25 @@ def init() -> bool:
     result = False
 
     try:
+        # Start the file writer
+        start_thread(save_worker, ())
+
+        # Open the database
+        init_store()
+
+        # Start the action workers
+        init_actions()
+
+        # Compile the regex rules
+        init_regex()
+
+        # Build the emoji trie
+        init_emoji()
+
+        # Build the special characters table
+        init_special()
+
+        # Check the version
         if glovar.current == glovar.version:
             return True
 
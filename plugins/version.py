@@ -22,6 +22,9 @@ from os.path import exists, isfile, join
 from random import choice
 from shutil import move, rmtree
 from string import ascii_letters, digits
+from typing import Any, List
+
+from .snapshot import dump_snapshot, get_journals, load_snapshot, read_snapshot, replay_journals
 
 
 def delete_file(path: str) -> bool:
@@ -73,6 +76,11 @@ def get_keywords(text: str) -> dict:
     return result
 
 
+def get_paths(file: str) -> List[str]:
+    # Get the snapshot, temp and backup paths of a data file
+    return [f"data/pickle/{file}", f"data/pickle/{file}.tmp", f"data/pickle/backup/{file}"]
+
+
 def get_reply(the_type: str, config: dict, origin: str) -> str:
     # Get reply text
     result = ""
@@ -105,6 +113,19 @@ def get_reply(the_type: str, config: dict, origin: str) -> str:
     return result
 
 
+def load_data(file: str) -> Any:
+    # Load a data file, which is a snapshot with journals or a legacy pickle
+    result = None
+
+    try:
+        loaded, seq, result = load_snapshot(get_paths(file))
+        loaded and replay_journals("data/pickle", file, result, seq)
+    except Exception as e:
+        print(f"Load data error: {e}")
+
+    return result
+
+
 def move_file(src: str, dst: str) -> bool:
     # Move a file
     result = False
@@ -154,6 +175,20 @@ def files(path):
             yield file
 
 
+def save_data(file: str, data: Any) -> bool:
+    # Save a data file as a snapshot newer than its snapshots and journals
+    result = False
+
+    try:
+        paths = get_paths(file)
+        seq = max([read_snapshot(path)[0] for path in paths] + list(get_journals("data/pickle", file))) + 1
+        result = dump_snapshot(paths[0], paths[2], pickle.dumps(data), seq)
+    except Exception as e:
+        print(f"Save data error: {e}")
+
+    return result
+
+
 def version_0() -> bool:
     # Version 0
     result = False
@@ -209,8 +244,7 @@ def version_0_2_0() -> bool:
 
     try:
         if exists("data/pickle/current"):
-            with open("data/pickle/current", "rb") as f:
-                current = pickle.load(f)
+            current = load_snapshot(["data/pickle/current"])[2] or ""
 
             if current >= "0.2.0":
                 return False
@@ -218,14 +252,12 @@ def version_0_2_0() -> bool:
         if not exists("data/pickle/configs"):
             return False
 
-        with open("data/pickle/configs", "rb") as f:
-            configs = pickle.load(f)
+        configs = load_data("configs")
 
         # Create channels data
         channels = {}
 
-        with open("data/pickle/message_ids", "rb") as f:
-            message_ids = pickle.load(f)
+        message_ids = load_data("message_ids")
 
         for gid in list(configs):
             channels[gid] = {
@@ -245,14 +277,11 @@ def version_0_2_0() -> bool:
             message_ids[gid].pop("channel", None)
             message_ids[gid].pop("hold", None)
 
-        with open("data/pickle/channels", "wb") as f:
-            pickle.dump(channels, f)
+        save_data("channels", channels)
 
-        with open("data/pickle/message_ids", "wb") as f:
-            pickle.dump(message_ids, f)
+        save_data("message_ids", message_ids)
 
-        with open("data/pickle/configs", "wb") as f:
-            pickle.dump(configs, f)
+        save_data("configs", configs)
 
         # Create pinned_ids
         pinned_ids = {}
@@ -266,11 +295,9 @@ def version_0_2_0() -> bool:
             else:
                 configs[gid]["hold"] = False
 
-        with open("data/pickle/pinned_ids", "wb") as f:
-            pickle.dump(pinned_ids, f)
+        save_data("pinned_ids", pinned_ids)
 
-        with open("data/pickle/configs", "wb") as f:
-            pickle.dump(configs, f)
+        save_data("configs", configs)
 
         # Create keywords data
         keywords = {}
@@ -310,11 +337,9 @@ def version_0_2_0() -> bool:
             configs[gid].pop("keyword_button", None)
             configs[gid].pop("keyword_link", None)
 
-        with open("data/pickle/keywords", "wb") as f:
-            pickle.dump(keywords, f)
+        save_data("keywords", keywords)
 
-        with open("data/pickle/configs", "wb") as f:
-            pickle.dump(configs, f)
+        save_data("configs", configs)
 
         # Create ots data
         ots = {}
@@ -329,11 +354,9 @@ def version_0_2_0() -> bool:
             configs[gid].pop("ot_button", None)
             configs[gid].pop("ot_link", None)
 
-        with open("data/pickle/ots", "wb") as f:
-            pickle.dump(ots, f)
+        save_data("ots", ots)
 
-        with open("data/pickle/configs", "wb") as f:
-            pickle.dump(configs, f)
+        save_data("configs", configs)
 
         # Create rms data
         rms = {}
@@ -350,11 +373,9 @@ def version_0_2_0() -> bool:
             configs[gid].pop("rm_button", None)
             configs[gid].pop("rm_link", None)
 
-        with open("data/pickle/rms", "wb") as f:
-            pickle.dump(rms, f)
+        save_data("rms", rms)
 
-        with open("data/pickle/configs", "wb") as f:
-            pickle.dump(configs, f)
+        save_data("configs", configs)
 
         # Create welcomes data
         welcomes = {}
@@ -371,11 +392,9 @@ def version_0_2_0() -> bool:
             configs[gid].pop("welcome_button", None)
             configs[gid].pop("welcome_link", None)
 
-        with open("data/pickle/welcomes", "wb") as f:
-            pickle.dump(welcomes, f)
+        save_data("welcomes", welcomes)
 
-        with open("data/pickle/configs", "wb") as f:
-            pickle.dump(configs, f)
+        save_data("configs", configs)
 
         print("Version 0.2.0 updated!\n")
 
@@ -392,8 +411,7 @@ def version_0_2_8() -> bool:
 
     try:
         if exists("data/pickle/current"):
-            with open("data/pickle/current", "rb") as f:
-                current = pickle.load(f)
+            current = load_snapshot(["data/pickle/current"])[2] or ""
 
             if current >= "0.2.8":
                 return False
@@ -401,8 +419,7 @@ def version_0_2_8() -> bool:
         if not exists("data/pickle/channels"):
             return False
 
-        with open("data/pickle/channels", "rb") as f:
-            channels = pickle.load(f)
+        channels = load_data("channels")
 
         for gid in list(channels):
             cid = channels[gid].get("cid")
@@ -415,8 +432,7 @@ def version_0_2_8() -> bool:
             print(f"Fixed {gid}'s data!")
             channels[gid]["cid"] = 0
 
-        with open("data/pickle/channels", "wb") as f:
-            pickle.dump(channels, f)
+        save_data("channels", channels)
 
         print("Version 0.2.8 updated!\n")
 
@@ -0,0 +1,39 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+from os.path import abspath, dirname
+from threading import Lock
+from types import ModuleType
+
+# Import the plugins from the repository
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+# Runtime data used by the tested functions, config.ini is not needed
+glovar = ModuleType("plugins.glovar")
+glovar.compiled = {}
+glovar.guard = False
+glovar.locks = {name: Lock() for name in ["config", "message", "regex"]}
+glovar.matcher = {}
+glovar.multi = True
+glovar.regex = {}
+glovar.regex_versions = {}
+glovar.suspect_words = {}
+glovar.time_regex = 5
+sys.modules["plugins.glovar"] = glovar
@@ -0,0 +1,105 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from queue import Queue
+from unittest.mock import Mock
+
+import pytest
+
+re2 = pytest.importorskip("re2")
+
+from plugins import glovar
+from plugins.functions import regex
+from plugins.functions.regex import compile_regex_set, get_candidates, get_pattern, get_re2_word, search_guarded
+
+# Rules which RE2 reads differently, with texts that Python matches
+python_only = [
+    (r"a[^\d]b", "a½b"),
+    (r"a[^\w]b", "a\u0301b"),
+    (r"a[^\D]b", "a5b"),
+    (r"foo{,2}bar", "fobar"),
+    ("\u0130", "i"),
+    ("\u0131", "I"),
+    (r"[\u0100-\u0140]", "i")
+]
+
+# Rules which RE2 reads as the dotted and dotless i in the texts, with texts that Python matches
+folded_i = [(r"i", "\u0130"), (r"I", "\u0131"), (r"[h-j]n", "\u0130n"), (r"b\x69t", "b\u0131t")]
+
+
+@pytest.mark.parametrize("word, text", python_only)
+def test_re2_word_python_only(word: str, text: str):
+    assert get_pattern(word).search(text)
+    assert get_re2_word(word) == ""
+
+
+@pytest.mark.parametrize("word, text", [(r"a[\d]b", "a\u0663b"), (r"\w+\s\d", "ab 1"), (r"a{0,2}b", "b")])
+def test_re2_word_superset(word: str, text: str):
+    assert get_pattern(word).search(text)
+    assert re2.compile(get_re2_word(word)).search(text)
+
+
+@pytest.mark.parametrize("word, text", python_only)
+def test_candidates_keep_python_only(word: str, text: str):
+    glovar.regex = {"ad": True}
+    glovar.compiled = {"ad": {word: get_pattern(word)}}
+    assert compile_regex_set()
+
+    patterns = list(glovar.compiled["ad"].items())
+    candidates = get_candidates(glovar.matcher, "ad", text, patterns)
+
+    assert [w for w, _ in candidates] == [word]
+
+
+@pytest.mark.parametrize("word, text", folded_i)
+def test_candidates_keep_folded_i(word: str, text: str):
+    glovar.regex = {"ad": True}
+    glovar.compiled = {"ad": {word: get_pattern(word)}}
+    assert compile_regex_set()
+    assert get_pattern(word).search(text)
+
+    patterns = list(glovar.compiled["ad"].items())
+    candidates = get_candidates(glovar.matcher, "ad", text, patterns)
+
+    assert [w for w, _ in candidates] == [word]
+    assert get_re2_word(word)
+
+
+def test_search_guarded_stops_runaway_rule(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(glovar, "time_regex", 1)
+
+    words = [r"nothing", r"(a+)+b", r"a{3}"]
+    hit, timeouts, unchecked = search_guarded(words, "a" * 40 + "c")
+
+    assert hit == r"a{3}"
+    assert timeouts == [r"(a+)+b"]
+    assert unchecked == []
+
+
+def test_search_guarded_returns_unchecked_rules(monkeypatch):
+    monkeypatch.setattr(regex, "workers", Queue())
+    monkeypatch.setattr(regex, "Popen", Mock(side_effect=OSError("no process")))
+
+    words = [r"(a+)+b", r"a{3}"]
+    hit, timeouts, unchecked = search_guarded(words, "aaa")
+
+    assert hit == ""
+    assert timeouts == []
+    assert unchecked == words